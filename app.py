@@ -1,67 +1,43 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, send_from_directory, abort
 from werkzeug.utils import secure_filename
 import os
 import time
 from datetime import timedelta
-import threading
 
 # Import custom modules
-from database.db_handler import Database
-from models.vehicle_detector import VehicleDetector
+# The ML stack (models.vehicle_detector: OpenCV, torch, ultralytics) is only
+# imported by the processing workers, so the web tier starts without loading it
+import config
+from database.cache import CachedDatabase
+from models.processing_options import allowed_file, parse_processing_options, stored_filename
+from monitoring import metrics
+from storage.manager import StorageManager
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['PROCESSED_FOLDER'] = 'static/videos'
+app.config['UPLOAD_FOLDER'] = config.UPLOAD_FOLDER
+app.config['PROCESSED_FOLDER'] = config.PROCESSED_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=2)
+app.config['EMBEDDED_WORKERS'] = 1  # worker threads started by `python app.py`; use worker.py in production
 
-# Allowed video extensions
-ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+# Folders served by /media/<kind>/<filename>
+MEDIA_FOLDERS = {'uploads': 'UPLOAD_FOLDER', 'videos': 'PROCESSED_FOLDER'}
 
-# Database instance
-db = Database()
+# Database instance; hot reads (status polling, dashboard, results) are served from memory
+db = CachedDatabase(**config.DB_SETTINGS, status_ttl=config.STATUS_CACHE_TTL,
+                    result_ttl=config.RESULT_CACHE_TTL, maxsize=config.CACHE_MAX_ENTRIES)
+storage = StorageManager(db)
 
-# Global processing status
-processing_status = {}
-
-def allowed_file(filename):
-    """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-def process_video_background(video_id, video_path, user_id):
-    """Background thread function to process video"""
-    global processing_status
-    
+@app.template_global()
+def media_url(kind, filename):
+    """URL of an uploaded or processed file, versioned by its modification time"""
+    path = os.path.join(app.config[MEDIA_FOLDERS[kind]], filename)
     try:
-        processing_status[video_id] = {'status': 'processing', 'progress': 0}
-        db.update_video_status(video_id, 'processing')
-        
-        # Initialize detector
-        detector = VehicleDetector()
-        
-        # Output path
-        output_filename = f"processed_{video_id}.mp4"
-        output_path = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
-        
-        # Process video
-        success, counts = detector.process_video(video_path, output_path, show_preview=False)
-        
-        if success:
-            # Save results to database
-            db.save_vehicle_counts(video_id, counts)
-            db.update_video_status(video_id, 'completed')
-            processing_status[video_id] = {'status': 'completed', 'progress': 100, 'counts': counts}
-        else:
-            db.update_video_status(video_id, 'failed')
-            processing_status[video_id] = {'status': 'failed', 'progress': 0}
-            
-    except Exception as e:
-        import traceback
-        print(f"Error processing video {video_id}: {e}")
-        traceback.print_exc()
-        db.update_video_status(video_id, 'failed')
-        processing_status[video_id] = {'status': 'failed', 'progress': 0, 'error': str(e)}
+        version = int(os.path.getmtime(path))
+    except OSError:
+        version = None
+    return url_for('serve_media', kind=kind, filename=filename, v=version)
 
 @app.route('/')
 def index():
@@ -157,6 +133,8 @@ def dashboard():
     # Process video list to include filenames
     for v in videos:
         v['video_filename'] = os.path.basename(v['video_path'])
+        poster_path = config.poster_path(v['id'])
+        v['poster_filename'] = os.path.basename(poster_path) if os.path.exists(poster_path) else None
     
     return render_template('dashboard.html', 
                          username=session['username'],
@@ -180,6 +158,14 @@ def upload_video():
     if not allowed_file(file.filename):
         return jsonify({'success': False, 'message': 'Invalid file type. Allowed: mp4, avi, mov, mkv'}), 400
     
+    # Per-user disk quota (originals and outputs)
+    allowed, used = storage.check_quota(session['user_id'], request.content_length or 0)
+    if not allowed:
+        return jsonify({
+            'success': False,
+            'message': f'Storage quota of {config.USER_QUOTA_MB} MB exceeded ({used // (1024 * 1024)} MB used). Delete some videos first.'
+        }), 413
+    
     try:
         # Secure filename
         filename = secure_filename(file.filename)
@@ -189,6 +175,8 @@ def upload_video():
         # Save file
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
         file.save(filepath)
+        metrics.UPLOADS.inc()
+        metrics.UPLOAD_BYTES.inc(os.path.getsize(filepath))
         
         # Save to database
         user_id = session['user_id']
@@ -213,39 +201,150 @@ def process_video(video_id):
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
     
     try:
-        # Get video info
-        videos = db.get_user_videos(session['user_id'])
-        video = next((v for v in videos if v['id'] == video_id), None)
+        # Get video info (uncached, so a worker's originals policy is seen)
+        video = db.get_video(video_id, session['user_id'])
         
         if not video:
             return jsonify({'success': False, 'message': 'Video not found'}), 404
         
-        video_path = video['video_path']
+        if video['original_status'] == 'deleted':
+            return jsonify({'success': False, 'message': 'The original video was deleted after processing'}), 410
         
-        # Start background processing
-        thread = threading.Thread(
-            target=process_video_background,
-            args=(video_id, video_path, session['user_id'])
-        )
-        thread.daemon = True
-        thread.start()
+        job = db.get_job_status(video_id)
+        if job and job['status'] in ('queued', 'processing'):
+            return jsonify({'success': False, 'message': 'Video is already queued or processing'}), 409
+        
+        # Inference size, mode, counting zones and profiling; unset values fall back to
+        # the video's stored inference size and zones, then to the defaults in config.py
+        request_options = request.get_json(silent=True) or request.form
+        options, error = parse_processing_options(request_options, video)
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
+        
+        # Zones given with the request are stored for later runs
+        if request_options.get('zones'):
+            db.save_zone_config(video_id, options['zones'])
+        
+        # Queue the job for a worker
+        success, job_id = db.enqueue_job(video_id, session['user_id'], options)
+        if not success:
+            return jsonify({'success': False, 'message': 'Database error'}), 500
         
         return jsonify({
             'success': True,
             'message': 'Processing started!',
-            'video_id': video_id
+            'video_id': video_id,
+            'job_id': job_id
         })
         
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/batch', methods=['POST'])
+def create_batch():
+    """Upload several videos and queue them all for processing"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    
+    files = [f for f in request.files.getlist('videos') if f.filename]
+    if not files:
+        return jsonify({'success': False, 'message': 'No video files uploaded'}), 400
+    
+    rejected = [f.filename for f in files if not allowed_file(f.filename)]
+    if rejected:
+        return jsonify({'success': False, 'message': f"Invalid file type: {', '.join(rejected)}"}), 400
+    
+    options, error = parse_processing_options(request.form)
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    
+    allowed, used = storage.check_quota(session['user_id'], request.content_length or 0)
+    if not allowed:
+        return jsonify({
+            'success': False,
+            'message': f'Storage quota of {config.USER_QUOTA_MB} MB exceeded ({used // (1024 * 1024)} MB used). Delete some videos first.'
+        }), 413
+    
+    # Save all files, then register and queue them in one transaction
+    timestamp = int(time.time())
+    videos = []
+    try:
+        for index, file in enumerate(files):
+            filename = secure_filename(file.filename)
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_filename(filename, index, timestamp))
+            file.save(filepath)
+            videos.append((filename, filepath))
+            metrics.UPLOADS.inc()
+            metrics.UPLOAD_BYTES.inc(os.path.getsize(filepath))
+        
+        success, batch_id, video_ids = db.create_batch(
+            session['user_id'], request.form.get('name') or f"Batch of {len(videos)} videos", videos, options
+        )
+    except Exception as e:
+        success, batch_id, video_ids = False, None, []
+        print(f"Batch upload error: {e}")
+    
+    if not success:
+        for _, filepath in videos:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        return jsonify({'success': False, 'message': 'Database error, nothing was queued'}), 500
+    
+    return jsonify({
+        'success': True,
+        'message': f'{len(video_ids)} videos queued for processing!',
+        'batch_id': batch_id,
+        'video_ids': video_ids
+    })
+
+@app.route('/batch/<int:batch_id>')
+def get_batch(batch_id):
+    """Aggregate progress and combined counts of a batch"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    
+    batch = db.get_batch_status(batch_id, session['user_id'])
+    if not batch:
+        return jsonify({'success': False, 'message': 'Batch not found'}), 404
+    
+    batch['success'] = True
+    return jsonify(batch)
+
+@app.route('/delete/<int:video_id>', methods=['POST'])
+def delete_video(video_id):
+    """Delete a video, its results and its files"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    
+    # Uncached: the cached list can be stale when workers or other web processes wrote since
+    video = db.get_video(video_id, session['user_id'])
+    
+    if not video:
+        return jsonify({'success': False, 'message': 'Video not found'}), 404
+    
+    job = db.get_job_status(video_id)
+    if job and job['status'] in ('queued', 'processing'):
+        return jsonify({'success': False, 'message': 'Video is queued or processing'}), 409
+    
+    freed = storage.delete_video(video)
+    if freed is None:
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    return jsonify({'success': True, 'message': 'Video deleted', 'freed_bytes': freed})
+
 @app.route('/status/<int:video_id>')
 def get_status(video_id):
     """Get processing status"""
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
     
-    status = processing_status.get(video_id, {'status': 'pending', 'progress': 0})
+    # Status lives in the database so every web process sees the workers' progress
+    job = db.get_job_status(video_id)
+    if job is None:
+        return jsonify({'status': 'pending', 'progress': 0})
+    
+    status = {'status': job['status'], 'progress': job['progress']}
+    if job['error']:
+        status['error'] = job['error']
     return jsonify(status)
 
 @app.route('/results/<int:video_id>')
@@ -255,8 +354,8 @@ def view_results(video_id):
         flash('Please login to view results!', 'warning')
         return redirect(url_for('login'))
     
-    videos = db.get_user_videos(session['user_id'])
-    video = next((v for v in videos if v['id'] == video_id), None)
+    # Uncached: the cached list can be stale when workers or other web processes wrote since
+    video = db.get_video(video_id, session['user_id'])
     
     if not video:
         flash('Video not found!', 'danger')
@@ -265,12 +364,74 @@ def view_results(video_id):
     # Add simple filenames
     video['video_filename'] = os.path.basename(video['video_path'])
     
-    return render_template('results.html', video=video, username=session['username'])
+    # Counts-only jobs have no annotated video
+    output_path = config.processed_video_path(video_id)
+    video['processed_filename'] = os.path.basename(output_path) if os.path.exists(output_path) else None
+    
+    # Preview images written during processing
+    sprite_path = config.sprite_path(video_id)
+    video['sprite_filename'] = os.path.basename(sprite_path) if os.path.exists(sprite_path) else None
+    poster_path = config.poster_path(video_id)
+    video['poster_filename'] = os.path.basename(poster_path) if os.path.exists(poster_path) else None
+    
+    # Profile of the last run, if it was profiled
+    profile_path = config.profile_path(video_id)
+    video['profile_filename'] = os.path.basename(profile_path) if os.path.exists(profile_path) else None
+    
+    # Per-zone breakdown
+    zone_counts = db.get_zone_counts(video_id)
+    
+    return render_template('results.html', video=video, zone_counts=zone_counts, username=session['username'])
+
+@app.route('/media/<kind>/<path:filename>')
+def serve_media(kind, filename):
+    """
+    Serve uploaded and processed videos with Range, ETag and cache headers.
+
+    Versioned URLs (?v=<mtime>, see media_url) are cached by browsers for
+    MEDIA_MAX_AGE; a reprocessed video gets a new URL. With MEDIA_ACCEL_PREFIX
+    set, nginx sends the file instead of this process.
+    """
+    if kind not in MEDIA_FOLDERS:
+        abort(404)
+    folder = app.config[MEDIA_FOLDERS[kind]]
+    max_age = config.MEDIA_MAX_AGE if request.args.get('v') else 0
+    
+    if config.MEDIA_ACCEL_PREFIX:
+        filename = secure_filename(filename)
+        if not os.path.isfile(os.path.join(folder, filename)):
+            abort(404)
+        response = Response(mimetype='video/mp4' if filename.endswith('.mp4') else None)
+        response.headers['X-Accel-Redirect'] = f"{config.MEDIA_ACCEL_PREFIX.rstrip('/')}/{kind}/{filename}"
+    else:
+        # conditional=True answers Range and If-None-Match requests; the file body is
+        # sent through wsgi.file_wrapper, which Gunicorn transmits with sendfile()
+        response = send_from_directory(folder, filename, conditional=True, etag=True, max_age=max_age)
+    
+    if max_age:
+        response.headers['Cache-Control'] = f"public, max-age={max_age}, immutable"
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics"""
+    queued = db.count_queued_jobs()
+    if queued is not None:
+        metrics.JOB_QUEUE_DEPTH.set(queued)
+    return Response(metrics.render_metrics(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     # Create necessary directories
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['PROCESSED_FOLDER'], exist_ok=True)
     
+    # Process jobs in this process too, so a single `python app.py` works for development
+    # (with the debug reloader only the child process, WERKZEUG_RUN_MAIN=true, serves requests)
+    if app.config['EMBEDDED_WORKERS'] and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from worker import start_workers
+        start_workers(db, app.config['EMBEDDED_WORKERS'])
+    
     # Run application
     app.run(debug=True, host='0.0.0.0', port=5000)
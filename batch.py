@@ -0,0 +1,121 @@
+"""
+Batch ingestion: register many videos and queue them for processing at once.
+
+The /batch endpoint does this for uploaded files; this script does it from
+the command line for local files, e.g. backfills too large to upload:
+
+    python batch.py --user alice /recordings/2024-05/
+    python batch.py --user alice --mode counts_only --wait clip1.mp4 clip2.mp4
+
+All videos of a batch are registered and queued in one database transaction;
+the workers then process them like any other job. Progress and combined
+counts are available from GET /batch/<id> or with --wait.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import config
+from models.processing_options import (PROCESSING_MODES, allowed_file, parse_processing_options,
+                                       stored_filename)
+
+
+def collect_videos(paths, recursive=False):
+    """Video files named by paths (files or directories), sorted per directory"""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    videos.extend(os.path.join(root, name) for name in sorted(files) if allowed_file(name))
+            else:
+                videos.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                              if allowed_file(name) and os.path.isfile(os.path.join(path, name)))
+        elif os.path.isfile(path) and allowed_file(path):
+            videos.append(path)
+        else:
+            print(f"Skipping {path}: not a video file or directory")
+    return videos
+
+
+def import_file(source_path, index, timestamp=None):
+    """Place a local file in the upload folder (hard link if possible, else copy)"""
+    from werkzeug.utils import secure_filename
+
+    target_path = os.path.join(config.UPLOAD_FOLDER,
+                               stored_filename(secure_filename(os.path.basename(source_path)), index, timestamp))
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copy2(source_path, target_path)
+    return target_path
+
+
+def format_batch_status(batch):
+    """One-line summary of get_batch_status() output"""
+    return (f"Batch {batch['id']}: {batch['completed']}/{batch['total']} completed, "
+            f"{batch['failed']} failed, {batch['processing']} processing, {batch['queued']} queued "
+            f"({batch['progress']}%)")
+
+
+def main():
+    from database.db_handler import Database
+
+    parser = argparse.ArgumentParser(description='Register and queue many videos for processing')
+    parser.add_argument('paths', nargs='+', help='video files or directories')
+    parser.add_argument('--user', required=True, help='username that will own the videos')
+    parser.add_argument('--name', help='batch name (default: first path)')
+    parser.add_argument('--recursive', action='store_true', help='include videos in subdirectories')
+    parser.add_argument('--mode', choices=sorted(PROCESSING_MODES))
+    parser.add_argument('--imgsz', help="inference size: 'auto' or an integer")
+    parser.add_argument('--zones', help='JSON file with a counting zone configuration')
+    parser.add_argument('--wait', action='store_true', help='wait for the batch and print the combined counts')
+    args = parser.parse_args()
+
+    zones = None
+    if args.zones:
+        with open(args.zones) as f:
+            zones = json.load(f)
+    options, error = parse_processing_options({'imgsz': args.imgsz, 'mode': args.mode, 'zones': zones})
+    if error:
+        sys.exit(error)
+
+    db = Database(**config.DB_SETTINGS)
+    user = db.get_user_by_username(args.user)
+    if not user:
+        sys.exit(f"Unknown user: {args.user}")
+
+    sources = collect_videos(args.paths, args.recursive)
+    if not sources:
+        sys.exit("No videos found")
+
+    os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
+    timestamp = int(time.time())
+    videos = []
+    for index, source in enumerate(sources):
+        videos.append((os.path.basename(source), import_file(source, index, timestamp)))
+
+    success, batch_id, video_ids = db.create_batch(user['id'], args.name or args.paths[0], videos, options)
+    if not success:
+        for name, path in videos:
+            os.remove(path)
+        sys.exit("Database error, nothing was queued")
+    print(f"Queued batch {batch_id} with {len(video_ids)} videos")
+
+    if args.wait:
+        while True:
+            batch = db.get_batch_status(batch_id, user['id'])
+            if batch:
+                print(format_batch_status(batch))
+                if batch['queued'] == 0 and batch['processing'] == 0:
+                    print(f"Combined counts: {json.dumps(batch['counts'])}")
+                    break
+            time.sleep(config.JOB_POLL_INTERVAL * 5)
+
+
+if __name__ == '__main__':
+    main()
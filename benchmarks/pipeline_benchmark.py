@@ -0,0 +1,266 @@
+"""
+Reproducible throughput benchmark for the detection pipeline.
+
+Runs VehicleDetector.process_video on a synthetic video (coloured rectangles
+driving down the frame) or on a recorded clip, with either the real YOLO
+model or a stub model that finds the rectangles with OpenCV, and reports
+FPS, per-stage p50/p99 latency and peak RSS as JSON.
+
+Usage (from the project root):
+    python -m benchmarks.pipeline_benchmark --frames 300 --output run.json
+    python -m benchmarks.pipeline_benchmark --video clip.mp4 --model yolov8n.pt --imgsz 480
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from models.vehicle_detector import VehicleDetector
+
+STAGES = ('decode', 'infer', 'track', 'draw', 'encode')
+
+# COCO class ids drawn into synthetic videos and the colour (BGR) used for each
+SYNTHETIC_CLASSES = {
+    2: (0, 200, 0),     # car
+    3: (200, 0, 0),     # motorcycle
+    5: (0, 0, 200),     # bus
+    7: (200, 0, 200),   # truck
+}
+COCO_NAMES = {0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+BACKGROUND = 40
+
+
+class StageTimer:
+    """Collects per-frame stage durations reported by process_video"""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def record(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def summary(self):
+        """Per-stage latency statistics in milliseconds"""
+        summary = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ms = np.asarray(samples) * 1000
+            summary[stage] = {
+                'count': len(samples),
+                'mean_ms': round(float(ms.mean()), 3),
+                'p50_ms': round(float(np.percentile(ms, 50)), 3),
+                'p99_ms': round(float(np.percentile(ms, 99)), 3),
+                'total_s': round(float(ms.sum() / 1000), 3),
+            }
+        return summary
+
+
+class _Array:
+    """Minimal stand-in for a torch tensor (.cpu().numpy())"""
+
+    def __init__(self, values):
+        self.values = values
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = _Array(xyxy)
+        self.conf = _Array(conf)
+        self.cls = _Array(cls)
+
+    def __len__(self):
+        return len(self.conf.values)
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubModel:
+    """
+    Stand-in for the YOLO model on synthetic videos.
+
+    Finds the coloured rectangles with a threshold and contour pass and
+    classifies them by colour, so the pipeline around the model is exercised
+    with realistic detection counts at a small, stable cost.
+    """
+
+    names = COCO_NAMES
+
+    def __init__(self):
+        self.class_ids = np.array(list(SYNTHETIC_CLASSES.keys()))
+        self.class_colors = np.array(list(SYNTHETIC_CLASSES.values()), dtype=float)
+
+    def __call__(self, frame, conf=0.25, classes=None, imgsz=None, verbose=False):
+        # Distance from the background in any channel: a gray threshold misses
+        # dark colours such as the motorcycle's blue and the bus's red
+        distance = np.abs(frame.astype(np.int16) - BACKGROUND).max(axis=2)
+        mask = (distance > 20).astype(np.uint8) * 255
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        boxes = []
+        class_ids = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if w < 4 or h < 4:
+                continue
+            color = frame[y + h // 2, x + w // 2].astype(float)
+            nearest = np.abs(self.class_colors - color).sum(axis=1).argmin()
+            boxes.append((x, y, x + w, y + h))
+            class_ids.append(self.class_ids[nearest])
+
+        xyxy = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+        cls = np.array(class_ids, dtype=np.float32)
+        conf = np.full(len(boxes), 0.9, dtype=np.float32)
+        if classes is not None and len(boxes):
+            keep = np.isin(cls.astype(int), classes)
+            xyxy, cls, conf = xyxy[keep], cls[keep], conf[keep]
+        return [_Result(_Boxes(xyxy, conf, cls))]
+
+
+def generate_synthetic_video(path, frames=300, width=1280, height=720, objects=8, fps=30, seed=0):
+    """Write a video of rectangles moving down the frame in lanes"""
+    rng = np.random.default_rng(seed)
+    lane_width = width // objects
+    class_ids = list(SYNTHETIC_CLASSES.keys())
+
+    lanes = []
+    for lane in range(objects):
+        class_id = class_ids[rng.integers(len(class_ids))]
+        box_w = int(lane_width * rng.uniform(0.4, 0.7))
+        box_h = int(box_w * rng.uniform(0.8, 1.6))
+        lanes.append({
+            'x': lane * lane_width + (lane_width - box_w) // 2,
+            'y': float(rng.uniform(-height, 0)),
+            'w': box_w,
+            'h': box_h,
+            'speed': float(rng.uniform(3, 9)) * height / 720,
+            'color': SYNTHETIC_CLASSES[class_id],
+        })
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    background = np.full((height, width, 3), BACKGROUND, dtype=np.uint8)
+    for _ in range(frames):
+        frame = background.copy()
+        for car in lanes:
+            y = int(car['y'])
+            cv2.rectangle(frame, (car['x'], y), (car['x'] + car['w'], y + car['h']), car['color'], -1)
+            car['y'] += car['speed']
+            if car['y'] > height:
+                car['y'] = -car['h']
+        writer.write(frame)
+    writer.release()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, if the platform reports it"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return round(peak / 1024, 1)
+
+
+def git_revision():
+    """Short commit hash of the working tree, if available"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(args):
+    """Run one benchmark and return the report dict"""
+    with tempfile.TemporaryDirectory() as workdir:
+        video_path = args.video
+        if not video_path:
+            video_path = os.path.join(workdir, 'synthetic.mp4')
+            generate_synthetic_video(video_path, args.frames, args.width, args.height,
+                                     args.objects, args.fps, args.seed)
+
+        model = StubModel() if args.model == 'stub' else None
+        imgsz = args.imgsz if args.imgsz in (None, 'auto') else int(args.imgsz)
+        detector = VehicleDetector(model_path=args.model, imgsz=imgsz, model=model)
+        detector.stage_timer = StageTimer()
+
+        output_path = None if args.mode == 'counts_only' else os.path.join(workdir, 'output.mp4')
+
+        # Keep stdout for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            start = time.perf_counter()
+            success, counts = detector.process_video(video_path, output_path, show_preview=False)
+            elapsed = time.perf_counter() - start
+
+    if not success:
+        raise RuntimeError(counts)
+
+    frames = len(detector.stage_timer.samples['decode'])
+    return {
+        'revision': git_revision(),
+        'config': {
+            'video': args.video or 'synthetic',
+            'frames': args.frames if not args.video else None,
+            'resolution': None if args.video else [args.width, args.height],
+            'objects': None if args.video else args.objects,
+            'model': args.model,
+            'imgsz': detector.inference_size,
+            'mode': args.mode,
+        },
+        'frames': frames,
+        'wall_s': round(elapsed, 3),
+        'fps': round(frames / elapsed, 2) if elapsed else None,
+        'stages': detector.stage_timer.summary(),
+        'peak_rss_mb': peak_rss_mb(),
+        'counts': counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the vehicle detection pipeline')
+    parser.add_argument('--video', help='recorded clip to use instead of a synthetic video')
+    parser.add_argument('--frames', type=int, default=300, help='synthetic video length')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--objects', type=int, default=8, help='vehicles in the synthetic video')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model', default='stub', help="'stub' or a YOLO weights file")
+    parser.add_argument('--imgsz', help="inference size, or 'auto'")
+    parser.add_argument('--mode', choices=['annotated', 'counts_only'], default='annotated')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
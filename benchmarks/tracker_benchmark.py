@@ -0,0 +1,237 @@
+"""
+Micro-benchmark and scale test for VehicleDetector.update_tracking.
+
+Feeds synthetic centroid streams straight into the tracker (no model, no
+video decoding or drawing) at increasing numbers of objects per frame and reports
+per-frame latency, memory and counting correctness against ground truth:
+
+- id_switches: frames where a ground-truth vehicle is matched to a
+  different track than in the previous frame
+- double_counts: extra counts credited to a vehicle already counted
+- missed_counts: vehicles that crossed the counting line but were never
+  counted
+- false_counts: counts that cannot be attributed to a crossing vehicle
+
+Usage (from the project root):
+    python -m benchmarks.tracker_benchmark --objects 10 50 100 250 500
+    python -m benchmarks.tracker_benchmark --objects 10 100 250 --max-p99-ms 20 --max-missed-ratio 0.3 --max-double-ratio 0
+
+With --max-* thresholds the exit status is 1 when any run exceeds them, so
+the script can be used as a regression gate.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from models.vehicle_detector import VehicleDetector
+
+VEHICLE_TYPES = ['car', 'bike', 'bus', 'truck']
+
+
+class _NamesOnlyModel:
+    """The tracker never calls the model; the detector only needs class names"""
+    names = {1: 'bicycle', 2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+
+
+class CentroidStream:
+    """
+    Synthetic scene of vehicles driving down the frame.
+
+    A fixed number of vehicles is on screen at all times; each one that
+    leaves at the bottom is replaced by a new vehicle entering at the top.
+    Vehicles placed below the counting line at the start never cross it and
+    are not expected to be counted.
+    """
+
+    def __init__(self, objects, width=1920, height=1080, line_y=None, jitter=1.0, dropout=0.0, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.width = width
+        self.height = height
+        self.line_y = line_y if line_y is not None else int(height * 0.6)
+        self.jitter = jitter
+        self.dropout = dropout
+        self.next_id = 0
+
+        self.ids = np.zeros(objects, dtype=int)
+        self.x = np.zeros(objects)
+        self.y = np.zeros(objects)
+        self.speed = np.zeros(objects)
+        self.types = [None] * objects
+        self.crossed = set()
+        for slot in range(objects):
+            self._spawn(slot, self.rng.uniform(-50, height))
+
+    def _spawn(self, slot, y):
+        self.ids[slot] = self.next_id
+        self.next_id += 1
+        self.x[slot] = self.rng.uniform(20, self.width - 20)
+        self.y[slot] = y
+        self.speed[slot] = self.rng.uniform(2, 8)
+        self.types[slot] = VEHICLE_TYPES[self.rng.integers(len(VEHICLE_TYPES))]
+
+    def next_frame(self):
+        """Advance one frame; return (gt_ids, centroids, vehicle_types) of visible detections"""
+        before = self.y.copy()
+        self.y += self.speed
+        for slot in np.flatnonzero((before <= self.line_y) & (self.y > self.line_y)):
+            self.crossed.add(int(self.ids[slot]))
+        for slot in np.flatnonzero(self.y > self.height + 50):
+            self._spawn(slot, self.rng.uniform(-50, 0))
+
+        visible = (self.y >= 0) & (self.y < self.height)
+        if self.dropout:
+            visible &= self.rng.random(len(self.y)) >= self.dropout
+
+        noise = self.rng.normal(0, self.jitter, (len(self.y), 2)) if self.jitter else np.zeros((len(self.y), 2))
+        points = np.stack([self.x, self.y], axis=1) + noise
+
+        gt_ids = []
+        centroids = []
+        vehicle_types = []
+        for slot in np.flatnonzero(visible):
+            gt_ids.append(int(self.ids[slot]))
+            centroids.append((int(points[slot, 0]), int(points[slot, 1])))
+            vehicle_types.append(self.types[slot])
+        return gt_ids, centroids, vehicle_types
+
+
+def make_tracker(width, height):
+    """Tracker with the default counting line, without loading a model"""
+    detector = VehicleDetector(model=_NamesOnlyModel())
+    detector.set_zones(width, height)
+    return detector
+
+
+def run_scale(objects, frames, width, height, jitter, dropout, seed):
+    """Run one stream through the tracker and score it"""
+    stream = CentroidStream(objects, width, height, jitter=jitter, dropout=dropout, seed=seed)
+    tracker = make_tracker(width, height)
+
+    frame_ms = []
+    live_tracks = []
+    assigned = {}          # ground-truth id -> track id in the previous frame
+    credited = {}          # ground-truth id -> number of counts credited to it
+    counted_tracks = set()
+    id_switches = 0
+    false_counts = 0
+
+    for _ in range(frames):
+        gt_ids, centroids, vehicle_types = stream.next_frame()
+
+        start = time.perf_counter()
+        tracker.update_tracking(centroids, vehicle_types)
+        frame_ms.append((time.perf_counter() - start) * 1000)
+        live_tracks.append(len(tracker.tracked_objects))
+
+        # Recover which track each detection ended up in
+        track_at = {
+            obj['centroid']: oid for oid, obj in tracker.tracked_objects.items() if obj['disappeared'] == 0
+        }
+        gt_of_track = {}
+        for gt_id, centroid in zip(gt_ids, centroids):
+            track_id = track_at.get(centroid)
+            if track_id is None:
+                continue
+            gt_of_track[track_id] = gt_id
+            if gt_id in assigned and assigned[gt_id] != track_id:
+                id_switches += 1
+            assigned[gt_id] = track_id
+
+        # Attribute the counts made this frame
+        newly_counted = [oid for oid, obj in tracker.tracked_objects.items()
+                         if obj['counted'] and oid not in counted_tracks]
+        for track_id in newly_counted:
+            counted_tracks.add(track_id)
+            gt_id = gt_of_track.get(track_id)
+            if gt_id is None or gt_id not in stream.crossed:
+                false_counts += 1
+            else:
+                credited[gt_id] = credited.get(gt_id, 0) + 1
+
+    expected = len(stream.crossed)
+    frame_ms = np.asarray(frame_ms)
+    return {
+        'objects': objects,
+        'frames': frames,
+        'per_frame_ms': {
+            'mean': round(float(frame_ms.mean()), 4),
+            'p50': round(float(np.percentile(frame_ms, 50)), 4),
+            'p99': round(float(np.percentile(frame_ms, 99)), 4),
+            'max': round(float(frame_ms.max()), 4),
+        },
+        'live_tracks_max': max(live_tracks),
+        'live_tracks_final': live_tracks[-1],
+        'expected_counts': expected,
+        'counted': sum(tracker.vehicle_counts.values()),
+        'id_switches': id_switches,
+        'double_counts': sum(n - 1 for n in credited.values() if n > 1),
+        'missed_counts': sum(1 for gt_id in stream.crossed if gt_id not in credited),
+        'false_counts': false_counts,
+    }
+
+
+def measure_memory(objects, frames, width, height, jitter, dropout, seed):
+    """Peak Python heap used by the tracker over a run, in KB"""
+    stream = CentroidStream(objects, width, height, jitter=jitter, dropout=dropout, seed=seed)
+    inputs = [stream.next_frame() for _ in range(frames)]
+    tracker = make_tracker(width, height)
+
+    tracemalloc.start()
+    for _, centroids, vehicle_types in inputs:
+        tracker.update_tracking(centroids, vehicle_types)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'current_kb': round(current / 1024, 1), 'peak_kb': round(peak / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the centroid tracker')
+    parser.add_argument('--objects', type=int, nargs='+', default=[10, 50, 100, 250, 500],
+                        help='vehicles on screen per frame, one run per value')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--jitter', type=float, default=1.0, help='centroid noise (pixels, std dev)')
+    parser.add_argument('--dropout', type=float, default=0.0, help='probability a vehicle is missed in a frame')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--max-p99-ms', type=float, help='fail if per-frame p99 exceeds this')
+    parser.add_argument('--max-missed-ratio', type=float, help='fail if missed/expected exceeds this')
+    parser.add_argument('--max-double-ratio', type=float, help='fail if double/expected exceeds this')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args()
+
+    runs = []
+    failures = []
+    for objects in args.objects:
+        run = run_scale(objects, args.frames, args.width, args.height, args.jitter, args.dropout, args.seed)
+        if not args.no_memory:
+            run['memory'] = measure_memory(objects, args.frames, args.width, args.height,
+                                           args.jitter, args.dropout, args.seed)
+        runs.append(run)
+
+        expected = max(run['expected_counts'], 1)
+        if args.max_p99_ms is not None and run['per_frame_ms']['p99'] > args.max_p99_ms:
+            failures.append(f"{objects} objects: p99 {run['per_frame_ms']['p99']}ms > {args.max_p99_ms}ms")
+        if args.max_missed_ratio is not None and run['missed_counts'] / expected > args.max_missed_ratio:
+            failures.append(f"{objects} objects: missed {run['missed_counts']}/{run['expected_counts']}")
+        if args.max_double_ratio is not None and run['double_counts'] / expected > args.max_double_ratio:
+            failures.append(f"{objects} objects: double counted {run['double_counts']}/{run['expected_counts']}")
+
+    report = {'runs': runs, 'failures': failures}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
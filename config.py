@@ -0,0 +1,67 @@
+"""
+Settings shared by the web application (app.py) and the processing workers
+(worker.py). Values can be overridden with the environment variables listed
+in .env.example.
+"""
+import os
+
+# Database
+DB_SETTINGS = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', ''),
+    'database': os.environ.get('DB_NAME', 'traffic_detection'),
+}
+
+# Storage (must point at the same files for the web tier and the workers)
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'static/uploads')
+PROCESSED_FOLDER = os.environ.get('PROCESSED_FOLDER', 'static/videos')
+
+# Web tier read cache (database/cache.py); bounds how stale status and results can be
+# when jobs run in separate worker processes
+STATUS_CACHE_TTL = float(os.environ.get('STATUS_CACHE_TTL', 2))
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 10))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+
+# Storage lifecycle (storage/manager.py); 0 disables a limit
+USER_QUOTA_MB = int(os.environ.get('USER_QUOTA_MB', 0))  # disk space per user for originals and outputs
+RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', 0))  # delete videos older than this
+FAILED_RETENTION_DAYS = int(os.environ.get('FAILED_RETENTION_DAYS', 7))  # delete failed videos older than this
+ORIGINALS_POLICY = os.environ.get('ORIGINALS_POLICY', 'keep')  # after processing: 'keep', 'delete' or 'compact'
+COMPACT_HEIGHT = int(os.environ.get('COMPACT_HEIGHT', 480))  # height of compacted originals
+COMPACT_CRF = int(os.environ.get('COMPACT_CRF', 32))  # x264 quality of compacted originals (higher is smaller)
+
+# Media serving (/media/...)
+MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', 365 * 24 * 3600))  # cache lifetime of versioned media URLs
+# Set to the internal nginx location (e.g. /protected-media) to hand file transfers to nginx via X-Accel-Redirect
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '')
+
+# Processing defaults
+YOLO_MODEL = os.environ.get('YOLO_MODEL', 'yolov8n.pt')
+INFERENCE_SIZE = os.environ.get('INFERENCE_SIZE', 'auto')  # 'auto' tunes per video, or a fixed size such as 640
+PROCESSING_MODE = os.environ.get('PROCESSING_MODE', 'annotated')  # or 'counts_only'
+
+# Job queue
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2.0))  # seconds between queue polls when idle
+JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 300))  # requeue jobs without a heartbeat for this long
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get('JOB_HEARTBEAT_INTERVAL', 30))  # seconds between heartbeats of a running job
+
+
+def processed_video_path(video_id):
+    """Path of the annotated output video for a video id"""
+    return os.path.join(PROCESSED_FOLDER, f"processed_{video_id}.mp4")
+
+
+def poster_path(video_id):
+    """Path of the poster image saved for a processed video"""
+    return os.path.join(PROCESSED_FOLDER, f"poster_{video_id}.jpg")
+
+
+def sprite_path(video_id):
+    """Path of the thumbnail sprite sheet saved for a processed video"""
+    return os.path.join(PROCESSED_FOLDER, f"sprite_{video_id}.jpg")
+
+
+def profile_path(video_id):
+    """Path of the folded-stack profile saved for a profiled job"""
+    return os.path.join(PROCESSED_FOLDER, f"profile_{video_id}.folded")
@@ -0,0 +1,241 @@
+"""
+In-memory read cache in front of the database for the web tier.
+
+TTLCache is a thread-safe, size-bounded map whose entries expire after a
+time-to-live and are evicted least recently used first. CachedDatabase uses
+it to answer the hot read paths (/status polling, dashboard) from memory.
+Requests that act on a single video read its row uncached with get_video. Writes made through it go to MySQL first and then update
+or drop the affected entries, so this process never serves its own stale
+data. Writes made by other processes (separate workers, other web servers)
+become visible when the entries expire, which is why the TTLs are short.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from database.db_handler import Database
+from monitoring import metrics
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe cache with per-entry expiry and LRU eviction"""
+
+    def __init__(self, name, maxsize=1024, ttl=30):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+
+    def get(self, key, default=None):
+        """Cached value for key, or default if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._entries.move_to_end(key)
+                value = entry[1]
+            else:
+                if entry is not _MISSING:
+                    del self._entries[key]
+                value = _MISSING
+        metrics.CACHE_REQUESTS.inc(cache=self.name, result='miss' if value is _MISSING else 'hit')
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl=None):
+        """Store value for ttl seconds (the cache default if None)"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+def _copy_rows(rows):
+    """Copy cached rows so callers can annotate them without touching the cache"""
+    if rows is None:
+        return None
+    if isinstance(rows, dict):
+        return dict(rows)
+    return [dict(row) for row in rows]
+
+
+class CachedDatabase(Database):
+    """
+    Database with cached job status, video lists, latest results and zone counts.
+
+    status_ttl bounds how stale /status can be when jobs run in other
+    processes; result_ttl does the same for the dashboard and results pages.
+    """
+
+    def __init__(self, host='localhost', user='root', password='', database='traffic_detection',
+                 status_ttl=2, result_ttl=10, maxsize=10000):
+        super().__init__(host, user, password, database)
+        self.job_status_cache = TTLCache('job_status', maxsize, status_ttl)
+        self.user_videos_cache = TTLCache('user_videos', maxsize, result_ttl)
+        self.latest_result_cache = TTLCache('latest_result', maxsize, result_ttl)
+        self.zone_counts_cache = TTLCache('zone_counts', maxsize, result_ttl)
+        # job id -> video id of jobs started from this process, for write-through on finish
+        self.job_videos = TTLCache('job_videos', maxsize, 24 * 3600)
+        # video id -> owner's user id, so writes that only know the video drop only the owner's lists
+        self.video_owners = TTLCache('video_owners', maxsize, 24 * 3600)
+
+    def _remember_owners(self, rows):
+        for row in rows or []:
+            self.video_owners.set(row['id'], row['user_id'])
+
+    def _invalidate_user(self, user_id):
+        self.user_videos_cache.delete(user_id)
+        self.latest_result_cache.delete(user_id)
+
+    def _invalidate_video(self, video_id):
+        self.zone_counts_cache.delete(video_id)
+        user_id = self.video_owners.get(video_id)
+        if user_id is not None:
+            self._invalidate_user(user_id)
+        else:
+            # Owner unknown (e.g. evicted): drop every user's lists to stay correct
+            self.user_videos_cache.clear()
+            self.latest_result_cache.clear()
+
+    # Cached reads
+    def get_job_status(self, video_id):
+        job = self.job_status_cache.get(video_id)
+        if job is None:
+            job = super().get_job_status(video_id)
+            if job is not None:
+                if job['status'] in ('completed', 'failed'):
+                    # Possibly finished by another process: refresh the lists that show it
+                    self._invalidate_video(video_id)
+                self.job_status_cache.set(video_id, job)
+        return _copy_rows(job)
+
+    def get_user_videos(self, user_id):
+        videos = self.user_videos_cache.get(user_id)
+        if videos is None:
+            videos = super().get_user_videos(user_id)
+            self._remember_owners(videos)
+            self.user_videos_cache.set(user_id, videos)
+        return _copy_rows(videos)
+
+    def get_latest_result(self, user_id):
+        result = self.latest_result_cache.get(user_id, _MISSING)
+        if result is _MISSING:
+            result = super().get_latest_result(user_id)
+            if result:
+                self._remember_owners([result])
+            self.latest_result_cache.set(user_id, result)
+        return _copy_rows(result)
+
+    def get_zone_counts(self, video_id):
+        zone_counts = self.zone_counts_cache.get(video_id)
+        if zone_counts is None:
+            zone_counts = super().get_zone_counts(video_id)
+            self.zone_counts_cache.set(video_id, zone_counts)
+        return _copy_rows(zone_counts)
+
+    # Writes: database first, then the cache
+    def save_video_upload(self, user_id, video_name, video_path):
+        result = super().save_video_upload(user_id, video_name, video_path)
+        success, video_id = result
+        if success:
+            self.video_owners.set(video_id, user_id)
+        self.user_videos_cache.delete(user_id)
+        return result
+
+    def update_video_status(self, video_id, status):
+        result = super().update_video_status(video_id, status)
+        self._invalidate_video(video_id)
+        return result
+
+    def update_video_path(self, video_id, video_path, original_status):
+        result = super().update_video_path(video_id, video_path, original_status)
+        self._invalidate_video(video_id)
+        return result
+
+    def save_inference_size(self, video_id, inference_size):
+        result = super().save_inference_size(video_id, inference_size)
+        self._invalidate_video(video_id)
+        return result
+
+    def save_zone_config(self, video_id, zones):
+        result = super().save_zone_config(video_id, zones)
+        self._invalidate_video(video_id)
+        return result
+
+    def save_vehicle_counts(self, video_id, counts):
+        result = super().save_vehicle_counts(video_id, counts)
+        self._invalidate_video(video_id)
+        return result
+
+    def save_zone_counts(self, video_id, zone_counts):
+        result = super().save_zone_counts(video_id, zone_counts)
+        self._invalidate_video(video_id)
+        return result
+
+    def delete_video(self, video_id):
+        result = super().delete_video(video_id)
+        self.job_status_cache.delete(video_id)
+        self._invalidate_video(video_id)
+        self.video_owners.delete(video_id)
+        return result
+
+    def create_batch(self, user_id, name, videos, options):
+        success, batch_id, video_ids = super().create_batch(user_id, name, videos, options)
+        if success:
+            for video_id in video_ids:
+                self.video_owners.set(video_id, user_id)
+                self.job_status_cache.set(video_id, {'status': 'queued', 'progress': 0, 'error': None})
+            self._invalidate_user(user_id)
+        return success, batch_id, video_ids
+
+    def enqueue_job(self, video_id, user_id, options):
+        success, job_id = super().enqueue_job(video_id, user_id, options)
+        if success:
+            self.video_owners.set(video_id, user_id)
+            self.job_status_cache.set(video_id, {'status': 'queued', 'progress': 0, 'error': None})
+            self._invalidate_video(video_id)
+        return success, job_id
+
+    def claim_job(self, worker_id):
+        job = super().claim_job(worker_id)
+        if job is not None:
+            self.job_videos.set(job['id'], job['video_id'])
+            self.video_owners.set(job['video_id'], job['user_id'])
+            self.job_status_cache.set(job['video_id'], {'status': 'processing', 'progress': 0, 'error': None})
+        return job
+
+    def update_job_progress(self, job_id, worker_id, progress):
+        result = super().update_job_progress(job_id, worker_id, progress)
+        video_id = self.job_videos.get(job_id)
+        if result and video_id is not None:
+            self.job_status_cache.set(video_id, {'status': 'processing', 'progress': progress, 'error': None})
+        return result
+
+    def finish_job(self, job_id, worker_id, status, error=None):
+        result = super().finish_job(job_id, worker_id, status, error)
+        video_id = self.job_videos.get(job_id)
+        self.job_videos.delete(job_id)
+        if video_id is not None:
+            if result:
+                progress = 100 if status == 'completed' else self.job_status_cache.get(video_id, {}).get('progress', 0)
+                self.job_status_cache.set(video_id, {'status': status, 'progress': progress, 'error': error})
+            else:
+                self.job_status_cache.delete(video_id)
+            self._invalidate_video(video_id)
+        return result
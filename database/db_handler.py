@@ -1,6 +1,9 @@
+import json
 import pymysql
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from monitoring.metrics import timed_query
+
 class Database:
     def __init__(self, host='localhost', user='root', password='', database='traffic_detection'):
         self.host = host
@@ -19,6 +22,7 @@ class Database:
         )
     
     # User Management Functions
+    @timed_query
     def register_user(self, username, email, password):
         """Register a new user"""
         try:
@@ -40,6 +44,7 @@ class Database:
             print(f"Registration error: {e}")
             return False, f"Error: {str(e)}"
     
+    @timed_query
     def login_user(self, username, password):
         """Authenticate user login"""
         try:
@@ -60,7 +65,25 @@ class Database:
         except Exception as e:
             return False, None
     
+    @timed_query
+    def get_user_by_username(self, username):
+        """Get a user's id and name by username"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute("SELECT id, username FROM users WHERE username = %s", (username,))
+            user = cursor.fetchone()
+            
+            cursor.close()
+            connection.close()
+            return user
+        except Exception as e:
+            print(f"Error fetching user: {e}")
+            return None
+    
     # Video Management Functions
+    @timed_query
     def save_video_upload(self, user_id, video_name, video_path):
         """Save video upload information"""
         try:
@@ -79,6 +102,7 @@ class Database:
         except Exception as e:
             return False, None
     
+    @timed_query
     def update_video_status(self, video_id, status):
         """Update video processing status"""
         try:
@@ -96,6 +120,82 @@ class Database:
             print(f"Update video status error: {e}")
             return False
     
+    @timed_query
+    def update_video_path(self, video_id, video_path, original_status):
+        """Record that a video's original was deleted or replaced by a compact copy"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = "UPDATE video_uploads SET video_path = %s, original_status = %s WHERE id = %s"
+            cursor.execute(query, (video_path, original_status, video_id))
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            return True
+        except Exception as e:
+            print(f"Update video path error: {e}")
+            return False
+    
+    @timed_query
+    def delete_video(self, video_id):
+        """Delete a video and (by cascade) its counts and jobs"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute("DELETE FROM video_uploads WHERE id = %s", (video_id,))
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            return True
+        except Exception as e:
+            print(f"Delete video error: {e}")
+            return False
+    
+    @timed_query
+    def get_all_videos(self):
+        """Get every video row, for storage maintenance; None on error"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = """
+                SELECT id, user_id, video_path, upload_time, processing_status, original_status
+                FROM video_uploads
+                ORDER BY id
+            """
+            cursor.execute(query)
+            videos = cursor.fetchall()
+            
+            cursor.close()
+            connection.close()
+            return videos
+        except Exception as e:
+            print(f"Error fetching videos: {e}")
+            return None
+    
+    @timed_query
+    def save_inference_size(self, video_id, inference_size):
+        """Store the inference resolution chosen for a video"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = "UPDATE video_uploads SET inference_size = %s WHERE id = %s"
+            cursor.execute(query, (inference_size, video_id))
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            return True
+        except Exception as e:
+            print(f"Update inference size error: {e}")
+            return False
+    
+    @timed_query
     def save_vehicle_counts(self, video_id, counts):
         """Save vehicle detection results"""
         try:
@@ -129,6 +229,456 @@ class Database:
             print(f"Error saving counts: {e}")
             return False
     
+    @timed_query
+    def save_zone_config(self, video_id, zones):
+        """Store the counting zone configuration for a video"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = "UPDATE video_uploads SET zone_config = %s WHERE id = %s"
+            cursor.execute(query, (json.dumps(zones) if zones else None, video_id))
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            return True
+        except Exception as e:
+            print(f"Update zone config error: {e}")
+            return False
+    
+    @timed_query
+    def save_zone_counts(self, video_id, zone_counts):
+        """Save per-zone detection results, replacing those of an earlier run"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute("DELETE FROM zone_counts WHERE video_id = %s", (video_id,))
+            
+            query = """
+                INSERT INTO zone_counts 
+                (video_id, zone_name, bike_count, activa_count, car_count, bus_count, truck_count, cycle_count, rickshaw_count, total_count)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """
+            cursor.executemany(query, [
+                (
+                    video_id,
+                    zone_name,
+                    counts.get('bike', 0),
+                    counts.get('activa', 0),
+                    counts.get('car', 0),
+                    counts.get('bus', 0),
+                    counts.get('truck', 0),
+                    counts.get('cycle', 0),
+                    counts.get('rickshaw', 0),
+                    sum(counts.values())
+                )
+                for zone_name, counts in zone_counts.items()
+            ])
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            return True
+        except Exception as e:
+            print(f"Error saving zone counts: {e}")
+            return False
+    
+    @timed_query
+    def get_zone_counts(self, video_id):
+        """Get per-zone detection results for a video"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = """
+                SELECT zone_name, bike_count, activa_count, car_count, bus_count, truck_count,
+                    cycle_count, rickshaw_count, total_count
+                FROM zone_counts
+                WHERE video_id = %s
+                ORDER BY id
+            """
+            cursor.execute(query, (video_id,))
+            zone_counts = cursor.fetchall()
+            
+            cursor.close()
+            connection.close()
+            return zone_counts
+        except Exception as e:
+            print(f"Error fetching zone counts: {e}")
+            return []
+    
+    # Processing Job Queue Functions
+    @timed_query
+    def enqueue_job(self, video_id, user_id, options):
+        """Queue a video for processing"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = "INSERT INTO processing_jobs (video_id, user_id, options) VALUES (%s, %s, %s)"
+            cursor.execute(query, (video_id, user_id, json.dumps(options)))
+            job_id = cursor.lastrowid
+            
+            query = "UPDATE video_uploads SET processing_status = 'queued' WHERE id = %s"
+            cursor.execute(query, (video_id,))
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            return True, job_id
+        except Exception as e:
+            print(f"Error queueing job: {e}")
+            return False, None
+    
+    @timed_query
+    def create_batch(self, user_id, name, videos, options):
+        """
+        Register videos and queue them as one batch, in a single transaction.
+        
+        videos is a list of (video_name, video_path). Returns
+        (success, batch_id, video_ids); on failure nothing is stored.
+        """
+        connection = None
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute("INSERT INTO processing_batches (user_id, name) VALUES (%s, %s)", (user_id, name))
+            batch_id = cursor.lastrowid
+            
+            zone_config = json.dumps(options['zones']) if options.get('zones') else None
+            encoded_options = json.dumps(options)
+            video_ids = []
+            for video_name, video_path in videos:
+                query = """
+                    INSERT INTO video_uploads (user_id, video_name, video_path, processing_status, zone_config)
+                    VALUES (%s, %s, %s, 'queued', %s)
+                """
+                cursor.execute(query, (user_id, video_name, video_path, zone_config))
+                video_ids.append(cursor.lastrowid)
+            
+            query = "INSERT INTO processing_jobs (video_id, user_id, batch_id, options) VALUES (%s, %s, %s, %s)"
+            cursor.executemany(query, [(video_id, user_id, batch_id, encoded_options) for video_id in video_ids])
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            return True, batch_id, video_ids
+        except Exception as e:
+            print(f"Error creating batch: {e}")
+            if connection is not None and connection.open:
+                connection.rollback()
+                connection.close()
+            return False, None, []
+    
+    @timed_query
+    def get_batch_status(self, batch_id, user_id):
+        """Aggregate job status, progress and combined counts of a user's batch"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = """
+                SELECT b.id, b.name, b.created_at,
+                    COUNT(j.id) AS total,
+                    COALESCE(SUM(j.status = 'queued'), 0) AS queued,
+                    COALESCE(SUM(j.status = 'processing'), 0) AS processing,
+                    COALESCE(SUM(j.status = 'completed'), 0) AS completed,
+                    COALESCE(SUM(j.status = 'failed'), 0) AS failed,
+                    COALESCE(ROUND(AVG(j.progress)), 0) AS progress
+                FROM processing_batches b
+                LEFT JOIN processing_jobs j ON j.batch_id = b.id
+                WHERE b.id = %s AND b.user_id = %s
+                GROUP BY b.id
+            """
+            cursor.execute(query, (batch_id, user_id))
+            batch = cursor.fetchone()
+            
+            if batch:
+                for key in ('total', 'queued', 'processing', 'completed', 'failed', 'progress'):
+                    batch[key] = int(batch[key])
+                
+                # Latest counts of every video in the batch
+                query = """
+                    SELECT v.id, v.video_name, j.status, j.progress, j.error,
+                        vc.bike_count, vc.activa_count, vc.car_count, vc.bus_count, vc.truck_count,
+                        vc.cycle_count, vc.rickshaw_count, vc.total_count
+                    FROM processing_jobs j
+                    JOIN video_uploads v ON v.id = j.video_id
+                    LEFT JOIN vehicle_counts vc ON vc.id = (
+                        SELECT MAX(id) FROM vehicle_counts WHERE video_id = j.video_id
+                    )
+                    WHERE j.batch_id = %s
+                    ORDER BY j.id
+                """
+                cursor.execute(query, (batch_id,))
+                batch['videos'] = cursor.fetchall()
+                
+                counts = {}
+                for video in batch['videos']:
+                    for key, value in video.items():
+                        if key.endswith('_count'):
+                            counts[key[:-len('_count')]] = counts.get(key[:-len('_count')], 0) + (value or 0)
+                batch['counts'] = counts
+            
+            cursor.close()
+            connection.close()
+            return batch
+        except Exception as e:
+            print(f"Error fetching batch status: {e}")
+            return None
+    
+    @timed_query
+    def claim_job(self, worker_id):
+        """Atomically take the oldest queued job for a worker; returns the job or None"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            # The UPDATE locks the row, so concurrent workers can never claim the same job
+            query = """
+                UPDATE processing_jobs
+                SET status = 'processing', worker_id = %s, started_at = NOW(), heartbeat_at = NOW()
+                WHERE status = 'queued'
+                ORDER BY id
+                LIMIT 1
+            """
+            claimed = cursor.execute(query, (worker_id,))
+            connection.commit()
+            
+            job = None
+            if claimed:
+                query = """
+                    SELECT j.id, j.video_id, j.user_id, j.options, v.video_path
+                    FROM processing_jobs j
+                    JOIN video_uploads v ON v.id = j.video_id
+                    WHERE j.worker_id = %s AND j.status = 'processing'
+                    ORDER BY j.started_at DESC, j.id DESC
+                    LIMIT 1
+                """
+                cursor.execute(query, (worker_id,))
+                job = cursor.fetchone()
+                if job:
+                    job['options'] = json.loads(job['options'] or '{}')
+            
+            cursor.close()
+            connection.close()
+            return job
+        except Exception as e:
+            print(f"Error claiming job: {e}")
+            return None
+    
+    @timed_query
+    def heartbeat_job(self, job_id, worker_id):
+        """
+        Record that the worker running a job is still alive.
+
+        Returns whether the worker still owns the job, or None if the
+        database could not be reached (ownership unknown).
+        """
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = """
+                UPDATE processing_jobs SET heartbeat_at = NOW()
+                WHERE id = %s AND worker_id = %s AND status = 'processing'
+            """
+            owned = cursor.execute(query, (job_id, worker_id)) > 0
+            connection.commit()
+            if not owned:
+                # Affected rows count changed rows only: a heartbeat in the same
+                # second as a progress update matches without changing anything
+                cursor.execute("""
+                    SELECT id FROM processing_jobs
+                    WHERE id = %s AND worker_id = %s AND status = 'processing'
+                """, (job_id, worker_id))
+                owned = cursor.fetchone() is not None
+            
+            cursor.close()
+            connection.close()
+            return owned
+        except Exception as e:
+            print(f"Job heartbeat error: {e}")
+            return None
+    
+    @timed_query
+    def update_job_progress(self, job_id, worker_id, progress):
+        """Record job progress (also serves as the worker heartbeat)"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = """
+                UPDATE processing_jobs SET progress = %s, heartbeat_at = NOW()
+                WHERE id = %s AND worker_id = %s AND status = 'processing'
+            """
+            cursor.execute(query, (progress, job_id, worker_id))
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            return True
+        except Exception as e:
+            print(f"Update job progress error: {e}")
+            return False
+    
+    @timed_query
+    def finish_job(self, job_id, worker_id, status, error=None):
+        """Mark a job completed or failed; False if the worker no longer owns it"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = """
+                UPDATE processing_jobs
+                SET status = %s, error = %s, finished_at = NOW(),
+                    progress = CASE WHEN %s = 'completed' THEN 100 ELSE progress END
+                WHERE id = %s AND worker_id = %s AND status = 'processing'
+            """
+            finished = cursor.execute(query, (status, error, status, job_id, worker_id))
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            return finished > 0
+        except Exception as e:
+            print(f"Finish job error: {e}")
+            return False
+    
+    @timed_query
+    def owns_job(self, job_id, worker_id):
+        """Whether a job is still being processed by this worker (not requeued)"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = """
+                SELECT id FROM processing_jobs
+                WHERE id = %s AND worker_id = %s AND status = 'processing'
+            """
+            cursor.execute(query, (job_id, worker_id))
+            owned = cursor.fetchone() is not None
+            
+            cursor.close()
+            connection.close()
+            return owned
+        except Exception as e:
+            print(f"Job ownership check error: {e}")
+            return False
+    
+    @timed_query
+    def requeue_stale_jobs(self, stale_after):
+        """Put jobs whose worker stopped sending heartbeats back in the queue"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = """
+                SELECT id, video_id FROM processing_jobs
+                WHERE status = 'processing' AND heartbeat_at < NOW() - INTERVAL %s SECOND
+                FOR UPDATE
+            """
+            cursor.execute(query, (stale_after,))
+            stale = cursor.fetchall()
+            
+            if stale:
+                job_ids = [job['id'] for job in stale]
+                video_ids = [job['video_id'] for job in stale]
+                placeholders = ', '.join(['%s'] * len(stale))
+                cursor.execute(f"""
+                    UPDATE processing_jobs
+                    SET status = 'queued', worker_id = NULL, progress = 0
+                    WHERE id IN ({placeholders})
+                """, job_ids)
+                # Otherwise the dashboard keeps showing "processing"
+                cursor.execute(f"""
+                    UPDATE video_uploads SET processing_status = 'queued'
+                    WHERE id IN ({placeholders})
+                """, video_ids)
+            connection.commit()
+            
+            cursor.close()
+            connection.close()
+            return len(stale)
+        except Exception as e:
+            print(f"Requeue stale jobs error: {e}")
+            return 0
+    
+    @timed_query
+    def get_job_status(self, video_id):
+        """Get the status of the latest processing job for a video"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = """
+                SELECT status, progress, error
+                FROM processing_jobs
+                WHERE video_id = %s
+                ORDER BY id DESC
+                LIMIT 1
+            """
+            cursor.execute(query, (video_id,))
+            job = cursor.fetchone()
+            
+            cursor.close()
+            connection.close()
+            return job
+        except Exception as e:
+            print(f"Error fetching job status: {e}")
+            return None
+    
+    @timed_query
+    def count_queued_jobs(self):
+        """Number of jobs waiting for a worker"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            cursor.execute("SELECT COUNT(*) AS queued FROM processing_jobs WHERE status = 'queued'")
+            queued = cursor.fetchone()['queued']
+            
+            cursor.close()
+            connection.close()
+            return queued
+        except Exception as e:
+            print(f"Error counting queued jobs: {e}")
+            return None
+    
+    @timed_query
+    def get_video(self, video_id, user_id=None):
+        """Get one video with its counts, optionally only if owned by user_id"""
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            query = """
+                SELECT 
+                    v.id, v.user_id, v.video_name, v.video_path, v.upload_time, v.processing_status, v.inference_size, v.zone_config, v.original_status,
+                    vc.bike_count, vc.activa_count, vc.car_count, vc.bus_count, vc.truck_count, 
+                    vc.cycle_count, vc.rickshaw_count, vc.total_count, vc.processed_at
+                FROM video_uploads v
+                LEFT JOIN vehicle_counts vc ON v.id = vc.video_id
+                WHERE v.id = %s
+            """
+            params = [video_id]
+            if user_id is not None:
+                query += " AND v.user_id = %s"
+                params.append(user_id)
+            cursor.execute(query, params)
+            video = cursor.fetchone()
+            
+            cursor.close()
+            connection.close()
+            return video
+        except Exception as e:
+            print(f"Error fetching video: {e}")
+            return None
+    
+    @timed_query
     def get_user_videos(self, user_id):
         """Get all videos uploaded by a user"""
         try:
@@ -137,7 +687,7 @@ class Database:
             
             query = """
                 SELECT 
-                    v.id, v.user_id, v.video_name, v.video_path, v.upload_time, v.processing_status,
+                    v.id, v.user_id, v.video_name, v.video_path, v.upload_time, v.processing_status, v.inference_size, v.zone_config, v.original_status,
                     vc.bike_count, vc.activa_count, vc.car_count, vc.bus_count, vc.truck_count, 
                     vc.cycle_count, vc.rickshaw_count, vc.total_count, vc.processed_at
                 FROM video_uploads v
@@ -155,6 +705,7 @@ class Database:
             print(f"Error fetching videos: {e}")
             return []
     
+    @timed_query
     def get_latest_result(self, user_id):
         """Get the latest processing result for a user"""
         try:
@@ -163,7 +714,7 @@ class Database:
             
             query = """
                 SELECT 
-                    v.id, v.user_id, v.video_name, v.video_path, v.upload_time, v.processing_status,
+                    v.id, v.user_id, v.video_name, v.video_path, v.upload_time, v.processing_status, v.inference_size, v.zone_config, v.original_status,
                     vc.bike_count, vc.activa_count, vc.car_count, vc.bus_count, vc.truck_count, 
                     vc.cycle_count, vc.rickshaw_count, vc.total_count, vc.processed_at
                 FROM video_uploads v
@@ -54,7 +54,10 @@ class DatabaseSetup:
                     video_name VARCHAR(255) NOT NULL,
                     video_path VARCHAR(500) NOT NULL,
                     upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    processing_status ENUM('pending', 'processing', 'completed', 'failed') DEFAULT 'pending',
+                    processing_status ENUM('pending', 'queued', 'processing', 'completed', 'failed') DEFAULT 'pending',
+                    inference_size INT DEFAULT NULL,
+                    zone_config TEXT DEFAULT NULL,
+                    original_status ENUM('present', 'compacted', 'deleted') DEFAULT 'present',
                     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
                 )
             """)
@@ -77,6 +80,60 @@ class DatabaseSetup:
                 )
             """)
             
+            # Per-zone count results table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS zone_counts (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    video_id INT NOT NULL,
+                    zone_name VARCHAR(100) NOT NULL,
+                    bike_count INT DEFAULT 0,
+                    activa_count INT DEFAULT 0,
+                    car_count INT DEFAULT 0,
+                    bus_count INT DEFAULT 0,
+                    truck_count INT DEFAULT 0,
+                    cycle_count INT DEFAULT 0,
+                    rickshaw_count INT DEFAULT 0,
+                    total_count INT DEFAULT 0,
+                    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE KEY uq_video_zone (video_id, zone_name),
+                    FOREIGN KEY (video_id) REFERENCES video_uploads(id) ON DELETE CASCADE
+                )
+            """)
+            
+            # Videos submitted together through /batch or batch.py
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS processing_batches (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    user_id INT NOT NULL,
+                    name VARCHAR(255),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                )
+            """)
+            
+            # Processing job queue, shared by the web tier and the workers
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS processing_jobs (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    video_id INT NOT NULL,
+                    user_id INT NOT NULL,
+                    batch_id INT DEFAULT NULL,
+                    options TEXT,
+                    status ENUM('queued', 'processing', 'completed', 'failed') DEFAULT 'queued',
+                    progress INT DEFAULT 0,
+                    error TEXT,
+                    worker_id VARCHAR(100) DEFAULT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP NULL DEFAULT NULL,
+                    heartbeat_at TIMESTAMP NULL DEFAULT NULL,
+                    finished_at TIMESTAMP NULL DEFAULT NULL,
+                    INDEX idx_status (status, id),
+                    INDEX idx_video (video_id, id),
+                    INDEX idx_batch (batch_id),
+                    FOREIGN KEY (video_id) REFERENCES video_uploads(id) ON DELETE CASCADE
+                )
+            """)
+            
             connection.commit()
             print("All tables created successfully!")
             cursor.close()
@@ -84,6 +141,62 @@ class DatabaseSetup:
             
         except Exception as e:
             print(f"Error creating tables: {e}")
+    
+    def upgrade_tables(self):
+        """Bring tables created by an earlier version up to the current schema"""
+        columns = [
+            ('video_uploads', 'inference_size', 'INT DEFAULT NULL'),
+            ('video_uploads', 'zone_config', 'TEXT DEFAULT NULL'),
+            ('video_uploads', 'original_status', "ENUM('present', 'compacted', 'deleted') DEFAULT 'present'"),
+            ('processing_jobs', 'batch_id', 'INT DEFAULT NULL'),
+        ]
+        
+        indexes = [
+            ('processing_jobs', 'idx_batch', 'batch_id'),
+        ]
+        
+        # Columns whose definition changed
+        modified_columns = [
+            ('video_uploads', 'processing_status',
+             "ENUM('pending', 'queued', 'processing', 'completed', 'failed') DEFAULT 'pending'"),
+        ]
+        
+        try:
+            connection = pymysql.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database
+            )
+            cursor = connection.cursor()
+            
+            for table, column, definition in columns:
+                cursor.execute("""
+                    SELECT COUNT(*) FROM information_schema.COLUMNS
+                    WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME = %s
+                """, (self.database, table, column))
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                    print(f"Added column {table}.{column}")
+            
+            for table, index, columns_sql in indexes:
+                cursor.execute("""
+                    SELECT COUNT(*) FROM information_schema.STATISTICS
+                    WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME = %s
+                """, (self.database, table, index))
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns_sql})")
+                    print(f"Added index {table}.{index}")
+            
+            for table, column, definition in modified_columns:
+                cursor.execute(f"ALTER TABLE {table} MODIFY COLUMN {column} {definition}")
+            
+            connection.commit()
+            cursor.close()
+            connection.close()
+            
+        except Exception as e:
+            print(f"Error upgrading tables: {e}")
 
 if __name__ == "__main__":
     # Initialize and setup database
@@ -96,3 +209,4 @@ if __name__ == "__main__":
     
     db_setup.create_database()
     db_setup.create_tables()
+    db_setup.upgrade_tables()
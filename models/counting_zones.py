@@ -0,0 +1,164 @@
+import cv2
+import numpy as np
+
+from models.zone_config import normalize_zone_config
+
+ZONE_COLOR = (0, 255, 255)
+
+
+def _cross(a, b):
+    """2D cross product of row-wise vectors"""
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+class CountingLine:
+    """
+    Line segment counting zone.
+
+    direction is 'both', 'right' or 'left': the side of the line (looking
+    from the first point towards the second, in image coordinates) that a
+    track must move onto to be counted. For a left-to-right horizontal line
+    'right' means moving down the frame.
+    """
+
+    def __init__(self, name, start, end, direction='both'):
+        if direction not in ('both', 'right', 'left'):
+            raise ValueError(f"Invalid line direction: {direction}")
+        self.name = name
+        self.label = name.replace('_', ' ').upper()
+        self.start = np.asarray(start, dtype=float)
+        self.end = np.asarray(end, dtype=float)
+        self.direction = direction
+
+    def crossings(self, prev, curr):
+        """Return a mask of the movements prev -> curr (N x 2 arrays) that cross the line"""
+        line = self.end - self.start
+        side_prev = _cross(line, prev - self.start) > 0
+        side_curr = _cross(line, curr - self.start) > 0
+
+        # The line's endpoints must lie on opposite sides of the movement
+        movement = curr - prev
+        start_side = _cross(movement, self.start - prev)
+        end_side = _cross(movement, self.end - prev)
+        within = start_side * end_side <= 0
+
+        if self.direction == 'right':
+            changed = ~side_prev & side_curr
+        elif self.direction == 'left':
+            changed = side_prev & ~side_curr
+        else:
+            changed = side_prev != side_curr
+        return changed & within
+
+    def draw(self, image, color=ZONE_COLOR):
+        """Draw the line and its name"""
+        start = tuple(int(v) for v in self.start)
+        end = tuple(int(v) for v in self.end)
+        cv2.line(image, start, end, color, 3)
+        cv2.putText(image, self.label, (start[0] + 10, start[1] - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+
+
+class CountingPolygon:
+    """
+    Polygon counting zone.
+
+    direction is 'in' (count tracks entering), 'out' (count tracks leaving)
+    or 'both'.
+    """
+
+    def __init__(self, name, points, direction='in'):
+        if direction not in ('both', 'in', 'out'):
+            raise ValueError(f"Invalid polygon direction: {direction}")
+        if len(points) < 3:
+            raise ValueError(f"Polygon zone '{name}' needs at least 3 points")
+        self.name = name
+        self.label = name.replace('_', ' ').upper()
+        self.points = np.asarray(points, dtype=float)
+        self.direction = direction
+
+    def contains(self, points):
+        """Return a mask of the points (N x 2 array) inside the polygon (ray casting)"""
+        x, y = points[:, 0], points[:, 1]
+        inside = np.zeros(len(points), dtype=bool)
+        for (x1, y1), (x2, y2) in zip(self.points, np.roll(self.points, -1, axis=0)):
+            if y1 == y2:
+                continue
+            straddles = (y1 > y) != (y2 > y)
+            x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= straddles & (x < x_cross)
+        return inside
+
+    def crossings(self, prev, curr):
+        """Return a mask of the movements prev -> curr (N x 2 arrays) that cross the boundary"""
+        inside_prev = self.contains(prev)
+        inside_curr = self.contains(curr)
+        if self.direction == 'in':
+            return ~inside_prev & inside_curr
+        if self.direction == 'out':
+            return inside_prev & ~inside_curr
+        return inside_prev != inside_curr
+
+    def draw(self, image, color=ZONE_COLOR):
+        """Draw the polygon outline and its name"""
+        outline = self.points.astype(np.int32).reshape(-1, 1, 2)
+        cv2.polylines(image, [outline], True, color, 2)
+        x, y = (int(v) for v in self.points[0])
+        cv2.putText(image, self.label, (x + 10, y - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+
+
+def build_zones(config, width, height):
+    """
+    Build zone objects from a JSON-style configuration
+    (see models.zone_config.normalize_zone_config) for a frame size
+    """
+    zones = []
+    for entry in normalize_zone_config(config):
+        points = np.asarray(entry['points'], dtype=float).reshape(-1, 2)
+        if entry['relative']:
+            points = points * [width, height]
+
+        if entry['type'] == 'line':
+            zones.append(CountingLine(entry['name'], points[0], points[1], entry['direction']))
+        else:
+            zones.append(CountingPolygon(entry['name'], points, entry['direction']))
+    return zones
+
+
+class ZoneCounter:
+    """Counts tracks crossing a set of zones, once per track and zone"""
+
+    def __init__(self, zones, vehicle_types):
+        self.zones = zones
+        self.counts = {zone.name: {vehicle_type: 0 for vehicle_type in vehicle_types} for zone in zones}
+        self.counted = {zone.name: set() for zone in zones}
+
+    def update(self, track_ids, prev, curr, vehicle_types):
+        """
+        Test one frame of track movements against every zone.
+
+        Returns the (track_id, zone_name) pairs counted in this frame.
+        """
+        events = []
+        if len(track_ids) == 0:
+            return events
+
+        prev = np.asarray(prev, dtype=float).reshape(-1, 2)
+        curr = np.asarray(curr, dtype=float).reshape(-1, 2)
+
+        for zone in self.zones:
+            counted = self.counted[zone.name]
+            for index in np.flatnonzero(zone.crossings(prev, curr)):
+                track_id = track_ids[index]
+                if track_id in counted:
+                    continue
+                counted.add(track_id)
+                self.counts[zone.name][vehicle_types[index]] += 1
+                events.append((track_id, zone.name))
+        return events
+
+    def forget(self, track_ids):
+        """Drop bookkeeping for tracks that have expired"""
+        for counted in self.counted.values():
+            counted.difference_update(track_ids)
@@ -0,0 +1,109 @@
+import cv2
+import numpy as np
+
+# Color coding for different vehicles (BGR)
+VEHICLE_COLORS = {
+    'bike': (255, 0, 0),      # Blue
+    'activa': (255, 255, 0),  # Cyan
+    'car': (0, 255, 0),       # Green
+    'bus': (0, 0, 255),       # Red
+    'truck': (255, 0, 255),   # Magenta
+    'cycle': (0, 255, 255),   # Yellow
+    'rickshaw': (128, 0, 128) # Purple
+}
+
+TEXT_COLOR = (255, 255, 255)
+
+
+class OverlayRenderer:
+    """
+    Draws annotations onto video frames.
+
+    Everything that does not change from frame to frame (the counting zones and
+    the counts panel) is rendered once into an overlay layer, together with an
+    alpha mask drawn with the same calls. Each frame gets the fully covered
+    pixels with a single indexed copy and the partly covered (antialiased edge)
+    pixels blended by their alpha. The layer is rebuilt only when the frame
+    size, zones or counts change. Detection boxes are drawn directly onto the
+    frame.
+    """
+
+    def __init__(self):
+        self._layer_key = None
+        self._static_layer = None
+        self._static_alpha = None
+        self._panel_counts = None
+        self._pixels = None
+        self._values = None
+        self._edge_pixels = None
+        self._edge_values = None
+        self._edge_keep = None
+
+    def _build_static_layer(self, shape, zones):
+        """Render the counting zones and their alpha mask for a frame size"""
+        layer = np.zeros(shape, dtype=np.uint8)
+        alpha = np.zeros(shape[:2], dtype=np.uint8)
+        for zone in zones:
+            zone.draw(layer)
+            zone.draw(alpha, color=255)
+        return layer, alpha
+
+    def _build_overlay(self, counts):
+        """Add the counts panel to the static layer and index its pixels"""
+        layer = self._static_layer.copy()
+        alpha = self._static_alpha.copy()
+
+        y_offset = 30
+        for vehicle_type, count in counts:
+            text = f"{vehicle_type.capitalize()}: {count}"
+            cv2.putText(layer, text, (10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.7, TEXT_COLOR, 2)
+            cv2.putText(alpha, text, (10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.7, 255, 2)
+            y_offset += 30
+
+        opaque = alpha == 255
+        self._pixels = np.nonzero(opaque)
+        self._values = layer[self._pixels]
+
+        # Drawn onto black, edge pixels hold color * alpha (premultiplied)
+        edges = (alpha > 0) & ~opaque
+        self._edge_pixels = np.nonzero(edges)
+        self._edge_values = layer[self._edge_pixels].astype(np.uint16)
+        self._edge_keep = (255 - alpha[self._edge_pixels]).astype(np.uint16)[:, None]
+
+    def render(self, frame, detections, vehicle_counts, zones):
+        """Draw the overlay, detections and counts onto frame in place"""
+        layer_key = (frame.shape, tuple(zones))
+        if layer_key != self._layer_key:
+            self._static_layer, self._static_alpha = self._build_static_layer(frame.shape, zones)
+            self._layer_key = layer_key
+            self._panel_counts = None
+
+        counts = tuple(vehicle_counts.items())
+        if counts != self._panel_counts:
+            self._build_overlay(counts)
+            self._panel_counts = counts
+
+        # Composite the cached layer: copy covered pixels, blend edge pixels
+        frame[self._pixels] = self._values
+        if len(self._edge_keep):
+            background = frame[self._edge_pixels].astype(np.uint16)
+            blended = (background * self._edge_keep + 127) // 255 + self._edge_values
+            frame[self._edge_pixels] = np.minimum(blended, 255).astype(np.uint8)
+
+        # Draw detections
+        for detection in detections:
+            x1, y1, x2, y2 = detection['box']
+            vehicle_type = detection['type']
+            color = VEHICLE_COLORS.get(vehicle_type, (255, 255, 255))
+
+            # Draw bounding box
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+
+            # Draw label
+            label = f"{vehicle_type}: {detection['confidence']:.2f}"
+            cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+            # Draw center point
+            cv2.circle(frame, detection['centroid'], 4, color, -1)
+
+        return frame
@@ -0,0 +1,79 @@
+"""
+Poster and sprite-sheet previews built from frames the pipeline already decodes.
+
+The dashboard and results page show these small JPEGs instead of loading the
+full video. Only the sampled frames are resized, so building the previews adds
+a few resizes per video to processing and no extra decoding.
+"""
+import cv2
+import numpy as np
+
+
+class PreviewBuilder:
+    """Collects preview frames during VehicleDetector.process_video"""
+
+    def __init__(self, total_frames, columns=5, rows=4, tile_width=160, poster_width=640,
+                 poster_position=0.1, quality=80):
+        self.columns = columns
+        self.rows = rows
+        self.tile_width = tile_width
+        self.poster_width = poster_width
+        self.quality = quality
+
+        # Frame numbers (1-based, as counted by process_video) to sample
+        tiles = columns * rows
+        if total_frames > 0:
+            step = total_frames / tiles
+            self.tile_frames = {int(step * index) + 1 for index in range(tiles)}
+            # A little way in, to skip black or title frames at the start
+            self.poster_frame = int(total_frames * poster_position) + 1
+        else:
+            # Unknown length: one tile per second at 30 FPS
+            self.tile_frames = {30 * index + 1 for index in range(tiles)}
+            self.poster_frame = 1
+
+        self.tiles = []
+        self.poster = None
+        self.last_frame = None
+
+    def _resize(self, frame, width):
+        height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+        return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+    def add(self, frame_number, frame):
+        """Offer a decoded frame; only sampled frames are kept"""
+        if frame_number in self.tile_frames and len(self.tiles) < self.columns * self.rows:
+            self.tiles.append(self._resize(frame, self.tile_width))
+        if frame_number == self.poster_frame:
+            self.poster = self._resize(frame, self.poster_width)
+        self.last_frame = frame
+
+    def sprite(self):
+        """Sprite sheet image (tiles in row-major order), or None without frames"""
+        if not self.tiles:
+            return None
+        tile_height, tile_width = self.tiles[0].shape[:2]
+        rows = -(-len(self.tiles) // self.columns)
+        sheet = np.zeros((rows * tile_height, self.columns * tile_width, 3), dtype=np.uint8)
+        for index, tile in enumerate(self.tiles):
+            row, column = divmod(index, self.columns)
+            sheet[row * tile_height:(row + 1) * tile_height,
+                  column * tile_width:(column + 1) * tile_width] = tile
+        return sheet
+
+    def save(self, poster_path=None, sprite_path=None):
+        """Write the poster and sprite sheet JPEGs; returns True if anything was written"""
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        written = False
+
+        poster = self.poster
+        if poster is None and self.last_frame is not None:
+            # Video shorter than the poster position
+            poster = self._resize(self.last_frame, self.poster_width)
+        if poster_path and poster is not None:
+            written = cv2.imwrite(poster_path, poster, params) or written
+
+        sheet = self.sprite()
+        if sprite_path and sheet is not None:
+            written = cv2.imwrite(sprite_path, sheet, params) or written
+        return written
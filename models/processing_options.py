@@ -0,0 +1,74 @@
+"""
+Upload and processing option handling shared by the web app and batch.py.
+
+Pure Python (no OpenCV or torch) so the web tier can validate requests
+without loading the ML stack.
+"""
+import json
+import time
+
+import config
+from models.zone_config import normalize_zone_config
+
+# Processing modes accepted by /process and /batch
+PROCESSING_MODES = {'annotated', 'counts_only'}
+
+# Accepted fixed inference sizes; multiples of 32 (the model stride)
+MIN_IMGSZ = 160
+MAX_IMGSZ = 1280
+
+# Video extensions accepted for upload and batch ingestion
+ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+
+
+def allowed_file(filename):
+    """Check if file extension is allowed"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def parse_processing_options(options, video=None):
+    """
+    Validate processing options from a request and fill in defaults.
+
+    Falls back to the video's stored inference size and zone configuration,
+    then to the defaults in config.py. Returns (options, error message).
+    """
+    imgsz = options.get('imgsz')
+    if imgsz in (None, ''):
+        imgsz = (video or {}).get('inference_size') or config.INFERENCE_SIZE
+    if imgsz != 'auto':
+        try:
+            imgsz = int(imgsz)
+        except (TypeError, ValueError):
+            return None, "imgsz must be 'auto' or an integer"
+        if not MIN_IMGSZ <= imgsz <= MAX_IMGSZ:
+            return None, f"imgsz must be between {MIN_IMGSZ} and {MAX_IMGSZ}"
+        # Round to the nearest multiple of 32, as ultralytics would (with a warning)
+        imgsz = int(round(imgsz / 32)) * 32
+
+    mode = options.get('mode') or config.PROCESSING_MODE
+    if mode not in PROCESSING_MODES:
+        return None, "mode must be 'annotated' or 'counts_only'"
+
+    zones = options.get('zones')
+    if zones:
+        try:
+            if isinstance(zones, str):
+                zones = json.loads(zones)
+            normalize_zone_config(zones)
+        except ValueError as e:
+            return None, f"Invalid zones: {e}"
+    elif video and video.get('zone_config'):
+        zones = json.loads(video['zone_config'])
+    else:
+        zones = None
+
+    profile = str(options.get('profile', '')).lower() in ('1', 'true', 'yes', 'on')
+
+    return {'imgsz': imgsz, 'mode': mode, 'zones': zones, 'profile': profile}, None
+
+
+def stored_filename(filename, index, timestamp=None):
+    """Unique upload-folder name for the index-th file of a batch"""
+    timestamp = timestamp or int(time.time())
+    return f"{timestamp}_{index}_{filename}"
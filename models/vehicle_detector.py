@@ -1,15 +1,35 @@
 import cv2
 import numpy as np
 from collections import defaultdict
-from ultralytics import YOLO
 import time
 
+from models.counting_zones import ZoneCounter, build_zones
+from models.overlay_renderer import OverlayRenderer
+from models.preview_builder import PreviewBuilder
+from monitoring.profiler import profile_to
+
 class VehicleDetector:
-    def __init__(self, model_path='yolov8n.pt'):
+    # Candidate inference sizes tried by auto-tuning (multiples of the 32px model stride)
+    IMGSZ_CANDIDATES = (320, 416, 480, 640, 800)
+    
+    def __init__(self, model_path='yolov8n.pt', imgsz=None, zones=None, model=None):
         """
         Initialize the vehicle detector with YOLOv8 model
+        
+        imgsz: inference resolution passed to the model. None keeps the
+        ultralytics default, an int fixes the size and 'auto' picks the
+        smallest adequate size per video (see auto_tune_imgsz).
+        zones: counting zone configuration (see models.counting_zones.build_zones).
+        None uses a single horizontal line at 60% of the frame height.
+        model: an already loaded model to use instead of loading model_path.
         """
-        self.model = YOLO(model_path)
+        if model is None:
+            # Imported here so that importing this module does not load torch
+            from ultralytics import YOLO
+            model = YOLO(model_path)
+        self.model = model
+        self.imgsz = imgsz
+        self.inference_size = imgsz if isinstance(imgsz, int) else None
         
         # Vehicle class mapping (COCO dataset classes)
         self.vehicle_classes = {
@@ -20,6 +40,13 @@ class VehicleDetector:
             'truck': 'truck'
         }
         
+        # COCO class ids for the vehicle classes, passed to the model so that
+        # NMS only runs over boxes we actually keep
+        self.vehicle_class_ids = [
+            class_id for class_id, class_name in self.model.names.items()
+            if class_name in self.vehicle_classes
+        ]
+        
         # Vehicle counts
         self.vehicle_counts = {
             'bike': 0,
@@ -35,6 +62,18 @@ class VehicleDetector:
         self.tracked_objects = {}
         self.next_object_id = 0
         self.max_disappeared = 30
+        self.max_distance = 80  # Increased threshold for better tracking
+        
+        # Counting zones, built once the frame size is known
+        self.zone_config = zones
+        self.zone_counter = None
+        
+        # Annotation renderer (caches the static overlay between frames)
+        self.overlay = OverlayRenderer()
+        
+        # Optional object with a record(stage, seconds) method; process_video
+        # reports decode/infer/track/draw/encode time for every frame to it
+        self.stage_timer = None
         
     def get_center(self, box):
         """Calculate center point of bounding box"""
@@ -51,50 +90,129 @@ class VehicleDetector:
         }
         self.next_object_id += 1
     
+    def set_zones(self, width, height):
+        """Build the counting zones for a frame size"""
+        zones = build_zones(self.zone_config, width, height)
+        self.zone_counter = ZoneCounter(zones, self.vehicle_counts.keys())
+    
     def update_tracking(self, centroids, vehicle_types):
-        """Update object tracking"""
-        if len(self.tracked_objects) == 0:
-            for i, centroid in enumerate(centroids):
-                self.register_object(centroid, vehicle_types[i])
-        else:
-            object_ids = list(self.tracked_objects.keys())
-            object_centroids = [self.tracked_objects[oid]['centroid'] for oid in object_ids]
+        """
+        Update object tracking and count zone crossings
+        
+        Counting needs zones; call set_zones first when not going through
+        detect_vehicles/process_video.
+        """
+        object_ids = list(self.tracked_objects.keys())
+        matched = set()
+        
+        # Movements of matched tracks this frame, tested against the zones in one pass
+        moved_ids = []
+        moved_from = []
+        moved_to = []
+        
+        if object_ids and len(centroids) > 0:
+            object_centroids = np.array([self.tracked_objects[oid]['centroid'] for oid in object_ids], dtype=float)
             
-            if len(centroids) == 0:
-                for object_id in object_ids:
-                    self.tracked_objects[object_id]['disappeared'] += 1
-                    if self.tracked_objects[object_id]['disappeared'] > self.max_disappeared:
-                        del self.tracked_objects[object_id]
-            else:
-                # Simple distance-based tracking
-                for i, centroid in enumerate(centroids):
-                    min_distance = float('inf')
-                    closest_id = None
-                    
-                    for oid, obj_centroid in zip(object_ids, object_centroids):
-                        distance = np.linalg.norm(np.array(centroid) - np.array(obj_centroid))
-                        if distance < min_distance:
-                            min_distance = distance
-                            closest_id = oid
+            # Simple distance-based tracking: nearest existing track for every detection
+            distances = np.linalg.norm(
+                np.asarray(centroids, dtype=float)[:, None, :] - object_centroids[None, :, :], axis=2
+            )
+            closest = distances.argmin(axis=1)
+            min_distances = distances[np.arange(len(centroids)), closest]
+            
+            for i, centroid in enumerate(centroids):
+                if min_distances[i] < self.max_distance:
+                    closest_id = object_ids[closest[i]]
+                    moved_ids.append(closest_id)
+                    moved_from.append(object_centroids[closest[i]])
+                    moved_to.append(centroid)
                     
-                    if min_distance < 80:  # Increased threshold for better tracking
-                        self.tracked_objects[closest_id]['centroid'] = centroid
-                        self.tracked_objects[closest_id]['disappeared'] = 0
-                        
-                        # Count if crossing counting line and not already counted
-                        if not self.tracked_objects[closest_id]['counted']:
-                            vehicle_type = self.tracked_objects[closest_id]['type']
-                            # Counting line is now dynamic (set during process_video)
-                            line_y = getattr(self, 'counting_line_y', 300)
-                            if centroid[1] > line_y:
-                                self.vehicle_counts[vehicle_type] += 1
-                                self.tracked_objects[closest_id]['counted'] = True
-                    else:
-                        self.register_object(centroid, vehicle_types[i])
+                    self.tracked_objects[closest_id]['centroid'] = centroid
+                    self.tracked_objects[closest_id]['disappeared'] = 0
+                    matched.add(closest_id)
+                else:
+                    self.register_object(centroid, vehicle_types[i])
+        else:
+            for i, centroid in enumerate(centroids):
+                self.register_object(centroid, vehicle_types[i])
+        
+        # Age out tracks that were not seen this frame
+        expired = []
+        for object_id in object_ids:
+            if object_id in matched:
+                continue
+            self.tracked_objects[object_id]['disappeared'] += 1
+            if self.tracked_objects[object_id]['disappeared'] > self.max_disappeared:
+                del self.tracked_objects[object_id]
+                expired.append(object_id)
+        
+        if self.zone_counter is None:
+            return
+        if expired:
+            self.zone_counter.forget(expired)
+        
+        # Count crossings; each track adds to the vehicle totals once, on its first crossing
+        moved_types = [self.tracked_objects[oid]['type'] for oid in moved_ids]
+        for object_id, zone_name in self.zone_counter.update(moved_ids, moved_from, moved_to, moved_types):
+            tracked = self.tracked_objects[object_id]
+            if not tracked['counted']:
+                self.vehicle_counts[tracked['type']] += 1
+                tracked['counted'] = True
     
-    def detect_vehicles(self, frame):
-        """Detect vehicles in a single frame"""
-        results = self.model(frame, conf=0.3, verbose=False)
+    def predict(self, frame, imgsz=None):
+        """Run the model on a frame, restricted to vehicle classes"""
+        if imgsz is None:
+            imgsz = self.inference_size
+        if imgsz is None:
+            return self.model(frame, conf=0.3, classes=self.vehicle_class_ids, verbose=False)
+        return self.model(frame, conf=0.3, classes=self.vehicle_class_ids, imgsz=imgsz, verbose=False)
+    
+    def auto_tune_imgsz(self, video_path, candidates=None, sample_frames=8, tolerance=0.1):
+        """
+        Pick the smallest inference size whose detection count on a few sampled
+        frames stays within tolerance of the count at the largest size
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return None
+        
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        
+        # Sample frames spread evenly across the video
+        frames = []
+        for index in np.linspace(0, max(total_frames - 1, 0), sample_frames).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            ret, frame = cap.read()
+            if ret:
+                frames.append(frame)
+        cap.release()
+        
+        if not frames:
+            return None
+        
+        # Upscaling past the source resolution adds cost without adding detail
+        candidates = sorted(candidates or self.IMGSZ_CANDIDATES)
+        usable = [size for size in candidates if size <= max(width, height)]
+        candidates = usable or candidates[:1]
+        
+        detection_counts = {}
+        for size in candidates:
+            detection_counts[size] = sum(
+                len(result.boxes) for frame in frames for result in self.predict(frame, imgsz=size)
+            )
+        
+        reference = detection_counts[candidates[-1]]
+        for size in candidates:
+            if abs(detection_counts[size] - reference) <= tolerance * reference:
+                print(f"Auto-tuned inference size: {size} (detections {detection_counts})")
+                return size
+        return candidates[-1]
+    
+    def find_vehicles(self, frame):
+        """Run the model on a frame and convert its boxes into vehicle detections"""
+        results = self.predict(frame)
         
         centroids = []
         vehicle_types = []
@@ -102,88 +220,87 @@ class VehicleDetector:
         
         for result in results:
             boxes = result.boxes
-            for box in boxes:
-                # Get class name
-                class_id = int(box.cls[0])
-                class_name = self.model.names[class_id]
+            if len(boxes) == 0:
+                continue
+            
+            # Pull all boxes off the device in one go instead of per box
+            xyxy = boxes.xyxy.cpu().numpy()
+            confidences = boxes.conf.cpu().numpy()
+            class_ids = boxes.cls.cpu().numpy().astype(int)
+            
+            # Keep only vehicle classes (the model already filters, this guards custom models)
+            keep = np.isin(class_ids, self.vehicle_class_ids)
+            xyxy, confidences, class_ids = xyxy[keep], confidences[keep], class_ids[keep]
+            
+            centers = ((xyxy[:, :2] + xyxy[:, 2:]) / 2).astype(int)
+            narrow = (xyxy[:, 2] - xyxy[:, 0]) < (xyxy[:, 3] - xyxy[:, 1])
+            
+            for i, class_id in enumerate(class_ids.tolist()):
+                vehicle_type = self.vehicle_classes[self.model.names[class_id]]
+                confidence = float(confidences[i])
                 
-                # Check if it's a vehicle we're tracking
-                if class_name in self.vehicle_classes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    confidence = float(box.conf[0])
-                    
-                    vehicle_type = self.vehicle_classes[class_name]
-                    
-                    # Heuristic for demo: Distinguish Activa from Bike and Rickshaw from Car
-                    if vehicle_type == 'bike' and confidence > 0.6:
-                        vehicle_type = 'activa'
-                    elif vehicle_type == 'car' and (x2 - x1) / (y2 - y1) < 1.0: # Narrower than usual car
-                        vehicle_type = 'rickshaw'
-                        
-                    centroid = self.get_center([x1, y1, x2, y2])
-                    
-                    centroids.append(centroid)
-                    vehicle_types.append(vehicle_type)
-                    
-                    detections.append({
-                        'box': [int(x1), int(y1), int(x2), int(y2)],
-                        'confidence': confidence,
-                        'type': vehicle_type,
-                        'centroid': centroid
-                    })
+                # Heuristic for demo: Distinguish Activa from Bike and Rickshaw from Car
+                if vehicle_type == 'bike' and confidence > 0.6:
+                    vehicle_type = 'activa'
+                elif vehicle_type == 'car' and narrow[i]: # Narrower than usual car
+                    vehicle_type = 'rickshaw'
+                
+                x1, y1, x2, y2 = xyxy[i].astype(int).tolist()
+                centroid = (int(centers[i, 0]), int(centers[i, 1]))
+                
+                centroids.append(centroid)
+                vehicle_types.append(vehicle_type)
+                
+                detections.append({
+                    'box': [x1, y1, x2, y2],
+                    'confidence': confidence,
+                    'type': vehicle_type,
+                    'centroid': centroid
+                })
+        
+        return detections, centroids, vehicle_types
+    
+    def detect_vehicles(self, frame):
+        """Detect vehicles in a single frame"""
+        detections, centroids, vehicle_types = self.find_vehicles(frame)
         
         # Update tracking
+        if self.zone_counter is None:
+            self.set_zones(frame.shape[1], frame.shape[0])
         self.update_tracking(centroids, vehicle_types)
         
         return detections
     
     def draw_detections(self, frame, detections):
         """Draw bounding boxes and labels on frame"""
-        # Draw counting line (dynamic height)
-        line_y = getattr(self, 'counting_line_y', int(frame.shape[0] * 0.6))
-        cv2.line(frame, (0, line_y), (frame.shape[1], line_y), (0, 255, 255), 3)
-        cv2.putText(frame, "COUNTING LINE", (10, line_y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
-        
-        # Draw detections
-        for detection in detections:
-            x1, y1, x2, y2 = detection['box']
-            vehicle_type = detection['type']
-            confidence = detection['confidence']
-            
-            # Color coding for different vehicles
-            colors = {
-                'bike': (255, 0, 0),      # Blue
-                'activa': (255, 255, 0),  # Cyan
-                'car': (0, 255, 0),       # Green
-                'bus': (0, 0, 255),       # Red
-                'truck': (255, 0, 255),   # Magenta
-                'cycle': (0, 255, 255),   # Yellow
-                'rickshaw': (128, 0, 128) # Purple
-            }
-            
-            color = colors.get(vehicle_type, (255, 255, 255))
-            
-            # Draw bounding box
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-            
-            # Draw label
-            label = f"{vehicle_type}: {confidence:.2f}"
-            cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-            
-            # Draw center point
-            cv2.circle(frame, detection['centroid'], 4, color, -1)
+        if self.zone_counter is None:
+            self.set_zones(frame.shape[1], frame.shape[0])
+        return self.overlay.render(frame, detections, self.vehicle_counts, self.zone_counter.zones)
+    
+    def process_video(self, video_path, output_path=None, show_preview=False, profile_path=None,
+                      progress_callback=None, poster_path=None, sprite_path=None, stop_event=None):
+        """
+        Process entire video and count vehicles
         
-        # Draw counts
-        y_offset = 30
-        for vehicle_type, count in self.vehicle_counts.items():
-            text = f"{vehicle_type.capitalize()}: {count}"
-            cv2.putText(frame, text, (10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            y_offset += 30
+        Without an output_path and preview the video is only counted: frames
+        are neither annotated nor encoded. With a profile_path the run is
+        profiled and the profile saved there (see monitoring.profiler).
+        progress_callback, if given, is called with the percentage done
+        every 30 frames. poster_path and sprite_path save a poster image and
+        a sprite sheet of thumbnails (see models.preview_builder) sampled from
+        the frames as they are decoded. Setting stop_event (a threading.Event)
+        stops the run early; it then returns (False, message) without
+        saving previews.
+        """
+        if profile_path:
+            with profile_to(profile_path):
+                result = self.process_video(video_path, output_path, show_preview,
+                                            progress_callback=progress_callback,
+                                            poster_path=poster_path, sprite_path=sprite_path,
+                                            stop_event=stop_event)
+            print(f"Profile saved to {profile_path}")
+            return result
         
-        return frame
-    
-    def process_video(self, video_path, output_path=None, show_preview=False):
-        """Process entire video and count vehicles"""
         cap = cv2.VideoCapture(video_path)
         
         if not cap.isOpened():
@@ -195,8 +312,12 @@ class VehicleDetector:
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        # Set counting line at 60% of frame height
-        self.counting_line_y = int(height * 0.6)
+        # Build counting zones for this resolution
+        self.set_zones(width, height)
+        
+        # Choose the inference size for this video
+        if self.imgsz == 'auto':
+            self.inference_size = self.auto_tune_imgsz(video_path)
         
         # Video writer
         if output_path:
@@ -210,30 +331,65 @@ class VehicleDetector:
                 fourcc = cv2.VideoWriter_fourcc(*'mp4v')
                 out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
         
+        # Counts-only runs (no output video, no preview) skip annotation entirely
+        annotate = bool(output_path) or show_preview
+        
+        # Previews reuse the decoded (and, if annotating, drawn) frames
+        previews = PreviewBuilder(total_frames) if poster_path or sprite_path else None
+        
         frame_count = 0
         last_detections = []
         
         print(f"Processing video: {total_frames} frames at {fps} FPS")
         
+        # Optional per-stage timing sink (see stage_timer in __init__)
+        timer = self.stage_timer
+        clock = time.perf_counter
+        
+        stopped = False
         while True:
+            if stop_event is not None and stop_event.is_set():
+                stopped = True
+                break
+            
+            decode_start = clock()
             ret, frame = cap.read()
             if not ret:
                 break
             
             frame_count += 1
+            infer_start = clock()
+            track_start = draw_start = infer_start
             
             # Detect every frame for best accuracy, or every 2nd frame if performance is an issue
             # But ALWAYS draw on every frame using last_detections
             if frame_count % 1 == 0: # Check every frame
-                last_detections = self.detect_vehicles(frame)
+                last_detections, centroids, vehicle_types = self.find_vehicles(frame)
+                track_start = clock()
+                self.update_tracking(centroids, vehicle_types)
+                draw_start = clock()
             
-            # Always draw detections on the frame
-            frame = self.draw_detections(frame, last_detections)
+            # Draw detections on every annotated frame
+            if annotate:
+                frame = self.draw_detections(frame, last_detections)
+            encode_start = clock()
+            
+            if previews is not None:
+                previews.add(frame_count, frame)
             
             # Write frame
             if output_path:
                 out.write(frame)
             
+            if timer is not None:
+                timer.record('decode', infer_start - decode_start)
+                timer.record('infer', track_start - infer_start)
+                timer.record('track', draw_start - track_start)
+                if annotate:
+                    timer.record('draw', encode_start - draw_start)
+                if output_path:
+                    timer.record('encode', clock() - encode_start)
+            
             # Show preview
             if show_preview:
                 cv2.imshow('Vehicle Detection', frame)
@@ -241,15 +397,22 @@ class VehicleDetector:
                     break
             
             # Progress
-            if frame_count % 30 == 0:
+            if frame_count % 30 == 0 and total_frames > 0:
                 progress = (frame_count / total_frames) * 100
                 print(f"Progress: {progress:.2f}% - Frames: {frame_count}/{total_frames}")
+                if progress_callback is not None:
+                    progress_callback(min(progress, 100.0))
         
         cap.release()
         if output_path:
             out.release()
         if show_preview:
             cv2.destroyAllWindows()
+        if stopped:
+            print(f"Processing stopped after {frame_count} frames")
+            return False, "Processing stopped"
+        if previews is not None:
+            previews.save(poster_path, sprite_path)
         
         print("Processing completed!")
         print(f"Final Counts: {self.vehicle_counts}")
@@ -269,6 +432,7 @@ class VehicleDetector:
         }
         self.tracked_objects = {}
         self.next_object_id = 0
+        self.zone_counter = None
 
 # Test function
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+"""
+Counting zone configuration parsing.
+
+Pure Python so the web tier can validate zone configurations without
+importing numpy or OpenCV; models.counting_zones builds the zone objects.
+"""
+
+# Allowed directions per zone type; the first one is the default
+ZONE_DIRECTIONS = {
+    'line': ('both', 'right', 'left'),
+    'polygon': ('in', 'out', 'both'),
+}
+
+# Used when a video has no zone configuration: one full-width line at 60% height
+DEFAULT_ZONES = [
+    {'name': 'counting_line', 'type': 'line', 'points': [[0, 0.6], [1, 0.6]], 'relative': True, 'direction': 'both'}
+]
+
+
+def normalize_zone_config(config):
+    """
+    Validate a zone configuration and fill in defaults.
+
+    Each entry has a unique 'name', a 'type' ('line' or 'polygon'), a list of
+    [x, y] 'points' and optionally a 'direction'. With 'relative': true the
+    points are fractions of the frame width and height. Raises ValueError for
+    an invalid configuration.
+    """
+    if not config:
+        config = DEFAULT_ZONES
+    if not isinstance(config, list):
+        raise ValueError("Zone configuration must be a list of zones")
+
+    zones = []
+    names = set()
+    for entry in config:
+        if not isinstance(entry, dict):
+            raise ValueError("Each zone must be an object")
+
+        name = str(entry.get('name') or f"zone_{len(zones) + 1}")
+        if name in names:
+            raise ValueError(f"Duplicate zone name: {name}")
+        names.add(name)
+
+        zone_type = entry.get('type', 'line')
+        if zone_type not in ZONE_DIRECTIONS:
+            raise ValueError(f"Unknown zone type: {zone_type}")
+
+        direction = entry.get('direction', ZONE_DIRECTIONS[zone_type][0])
+        if direction not in ZONE_DIRECTIONS[zone_type]:
+            raise ValueError(f"Invalid {zone_type} direction: {direction}")
+
+        try:
+            points = [[float(x), float(y)] for x, y in entry.get('points', [])]
+        except (TypeError, ValueError):
+            raise ValueError(f"Zone '{name}' points must be [x, y] pairs")
+        if zone_type == 'line' and len(points) != 2:
+            raise ValueError(f"Line zone '{name}' needs exactly 2 points")
+        if zone_type == 'polygon' and len(points) < 3:
+            raise ValueError(f"Polygon zone '{name}' needs at least 3 points")
+
+        zones.append({
+            'name': name,
+            'type': zone_type,
+            'points': points,
+            'relative': bool(entry.get('relative')),
+            'direction': direction,
+        })
+    return zones
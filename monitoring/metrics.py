@@ -0,0 +1,187 @@
+"""
+Lightweight in-process metrics exposed in the Prometheus text format.
+
+Counters, gauges and histograms are plain Python objects guarded by a lock,
+so recording a sample costs a lock acquisition and a few additions and is
+cheap enough for the per-frame hot path. render_metrics() produces the body
+of the /metrics endpoint.
+"""
+import bisect
+import functools
+import threading
+import time
+
+# Histogram buckets (seconds) for per-frame stages and database queries
+FRAME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+QUERY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value"""
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0)]
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+    type_name = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=FRAME_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        lines = []
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Processing pipeline
+FRAME_STAGE_SECONDS = Histogram(
+    'traffic_frame_stage_seconds', 'Time spent per frame in each processing stage', ['stage'], FRAME_BUCKETS
+)
+FRAMES_PROCESSED = Counter('traffic_frames_processed_total', 'Video frames decoded by processing jobs')
+JOBS_IN_FLIGHT = Gauge('traffic_jobs_in_flight', 'Processing jobs currently running')
+JOB_QUEUE_DEPTH = Gauge('traffic_job_queue_depth', 'Processing jobs accepted but not yet started')
+JOBS_FINISHED = Counter('traffic_jobs_finished_total', 'Processing jobs finished, by outcome', ['status'])
+JOB_SECONDS = Histogram(
+    'traffic_job_seconds', 'Wall time of processing jobs', buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+
+# Database
+DB_QUERY_SECONDS = Histogram('traffic_db_query_seconds', 'Database call latency', ['method'], QUERY_BUCKETS)
+
+# Web tier read cache (database/cache.py)
+CACHE_REQUESTS = Counter('traffic_cache_requests_total', 'Read cache lookups, by cache and hit/miss', ['cache', 'result'])
+
+# Uploads
+UPLOADS = Counter('traffic_uploads_total', 'Videos uploaded')
+UPLOAD_BYTES = Counter('traffic_upload_bytes_total', 'Bytes of uploaded video')
+
+
+class StageMetrics:
+    """Stage timer for VehicleDetector.stage_timer that feeds FRAME_STAGE_SECONDS"""
+
+    def record(self, stage, seconds):
+        FRAME_STAGE_SECONDS.observe(seconds, stage=stage)
+        if stage == 'decode':
+            FRAMES_PROCESSED.inc()
+
+
+def timed_query(func):
+    """Decorator for Database methods recording latency per method"""
+    method = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, method=method)
+    return wrapper
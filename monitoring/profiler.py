@@ -0,0 +1,88 @@
+"""
+Opt-in profiling for a single processing job.
+
+profile_to(path) profiles the code run inside it. A path ending in .prof
+gets a deterministic cProfile dump (pstats format, for snakeviz or
+flameprof). Any other path gets a statistical profile from SamplingProfiler
+in the folded-stack format ("frame;frame;frame count" per line), which
+flamegraph.pl, speedscope and inferno read directly.
+"""
+import contextlib
+import cProfile
+import os
+import sys
+import threading
+from collections import Counter
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of one thread at a fixed interval.
+
+    Runs in a background thread and only reads frames, so the profiled
+    code is not instrumented and overhead stays low (roughly one stack walk
+    per interval).
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling (the calling thread unless thread_id was given)"""
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def save(self, path):
+        """Write the collected stacks in folded format"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextlib.contextmanager
+def profile_to(path, interval=0.005):
+    """Profile the enclosed block and save the result to path"""
+    if path.endswith('.prof'):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+    else:
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            profiler.save(path)
@@ -79,17 +79,22 @@ document.querySelectorAll('.process-btn').forEach(button => {
         this.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Starting...';
         
         try {
+            // Counts-only jobs skip drawing and encoding the output video
+            const annotated = document.getElementById('annotatedOutput').checked;
+            
             const response = await fetch(`/process/${videoId}`, {
-                method: 'POST'
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ mode: annotated ? 'annotated' : 'counts_only' })
             });
             
             const result = await response.json();
             
             if (result.success) {
-                showAlert('Processing started! The page will update when complete.', 'info');
+                showAlert('Video queued for processing! The page will update when complete.', 'info');
                 
                 // Update button
-                this.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Processing';
+                this.innerHTML = '<i class="fas fa-clock"></i> Queued';
                 this.classList.remove('btn-primary');
                 this.classList.add('btn-warning');
                 
@@ -109,6 +114,36 @@ document.querySelectorAll('.process-btn').forEach(button => {
     });
 });
 
+// Delete Video Buttons
+document.querySelectorAll('.delete-btn').forEach(button => {
+    button.addEventListener('click', async function() {
+        const videoId = this.getAttribute('data-video-id');
+        
+        if (!confirmAction('Delete this video and its results? This cannot be undone.')) {
+            return;
+        }
+        
+        this.disabled = true;
+        
+        try {
+            const response = await fetch(`/delete/${videoId}`, { method: 'POST' });
+            const result = await response.json();
+            
+            if (result.success) {
+                this.closest('tr').remove();
+                showAlert('Video deleted.', 'success');
+            } else {
+                showAlert('Failed to delete video: ' + result.message, 'danger');
+                this.disabled = false;
+            }
+        } catch (error) {
+            console.error('Delete error:', error);
+            showAlert('Delete error: ' + error.message, 'danger');
+            this.disabled = false;
+        }
+    });
+});
+
 // Poll processing status
 function pollProcessingStatus(videoId) {
     const pollInterval = setInterval(async () => {
@@ -144,6 +179,10 @@ function pollProcessingStatus(videoId) {
                 if (processBtn) {
                     processBtn.innerHTML = `<i class="fas fa-spinner fa-spin"></i> Processing (${status.progress || 0}%)`;
                 }
+            } else if (status.status === 'queued') {
+                if (processBtn) {
+                    processBtn.innerHTML = '<i class="fas fa-clock"></i> Queued';
+                }
             }
         } catch (error) {
             console.error('Status poll error:', error);
@@ -0,0 +1,283 @@
+"""
+Storage lifecycle for uploaded originals and processing outputs.
+
+StorageManager enforces per-user quotas, applies the originals policy once a
+video is processed (keep it, delete it or replace it with a low-bitrate copy),
+deletes videos past their retention period and reconciles the database with
+the files on disk. Run the periodic part from cron:
+
+    python -m storage.manager usage
+    python -m storage.manager cleanup --dry-run
+    python -m storage.manager cleanup
+
+Settings (USER_QUOTA_MB, RETENTION_DAYS, FAILED_RETENTION_DAYS,
+ORIGINALS_POLICY, ...) live in config.py.
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+import config
+from models.processing_options import allowed_file
+
+# Files written per video in PROCESSED_FOLDER, e.g. processed_12.mp4, poster_12.jpg
+OUTPUT_FILE_PATTERN = re.compile(r'^(processed|poster|sprite|profile)_(\d+)\.')
+
+# Temporary outputs of a running job (see worker.part_path), e.g. processed_12.part-3f9a1c2e.mp4
+PART_FILE_PATTERN = re.compile(r'\.part-[0-9a-f]+\.')
+
+# Files younger than this are never treated as orphans (an upload is saved before its row)
+ORPHAN_GRACE_SECONDS = 3600
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class StorageManager:
+    """Disk usage, originals policy, retention and reconciliation"""
+
+    def __init__(self, db, dry_run=False):
+        self.db = db
+        self.dry_run = dry_run
+
+    def _remove(self, path):
+        """Delete a file if it exists; returns the bytes freed"""
+        size = _size(path)
+        if not os.path.exists(path):
+            return 0
+        if self.dry_run:
+            print(f"Would delete {path}")
+        else:
+            os.remove(path)
+        return size
+
+    def output_paths(self, video_id):
+        """Every file the workers may write for a video"""
+        return [
+            config.processed_video_path(video_id),
+            config.poster_path(video_id),
+            config.sprite_path(video_id),
+            config.profile_path(video_id),
+        ]
+
+    def video_usage(self, video):
+        """Bytes used on disk by a video row's original and outputs"""
+        return _size(video['video_path']) + sum(_size(path) for path in self.output_paths(video['id']))
+
+    def user_usage(self, user_id):
+        """Bytes used on disk by all of a user's videos"""
+        return sum(self.video_usage(video) for video in self.db.get_user_videos(user_id))
+
+    def check_quota(self, user_id, incoming_bytes=0):
+        """Whether a user can store incoming_bytes more; returns (allowed, used_bytes)"""
+        used = self.user_usage(user_id)
+        if not config.USER_QUOTA_MB:
+            return True, used
+        return used + incoming_bytes <= config.USER_QUOTA_MB * 1024 * 1024, used
+
+    def remove_outputs(self, video_id):
+        """Delete a video's outputs (e.g. partial files of a failed job)"""
+        return sum(self._remove(path) for path in self.output_paths(video_id))
+
+    def delete_video(self, video):
+        """Delete a video's database rows and files; returns the bytes freed, None on error"""
+        # Re-read the row: a worker may have compacted the original since video was fetched
+        video = self.db.get_video(video['id']) or video
+        # Rows first: files left behind by a failure here are found by reconcile()
+        if not self.dry_run and not self.db.delete_video(video['id']):
+            return None
+        return self._remove(video['video_path']) + self.remove_outputs(video['id'])
+
+    def compact_video(self, source_path, target_path):
+        """Re-encode a video at low resolution and bitrate; returns True on success"""
+        if shutil.which('ffmpeg'):
+            command = [
+                'ffmpeg', '-y', '-loglevel', 'error', '-i', source_path,
+                '-vf', f"scale=-2:'min({config.COMPACT_HEIGHT},ih)'",
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(config.COMPACT_CRF),
+                '-an', '-movflags', '+faststart', target_path,
+            ]
+            return subprocess.run(command).returncode == 0 and _size(target_path) > 0
+
+        # No ffmpeg: downscale with OpenCV (imported here so the web tier does not load it)
+        import cv2
+        cap = cv2.VideoCapture(source_path)
+        if not cap.isOpened():
+            return False
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        scale = min(1.0, config.COMPACT_HEIGHT / height) if height else 1.0
+        size = (int(width * scale) // 2 * 2, int(height * scale) // 2 * 2)
+        out = cv2.VideoWriter(target_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if scale < 1.0:
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            out.write(frame)
+        cap.release()
+        out.release()
+        return _size(target_path) > 0
+
+    def apply_originals_policy(self, video_id, video_path, policy=None):
+        """
+        Apply ORIGINALS_POLICY to a processed video's original upload.
+
+        'keep' leaves it alone, 'delete' removes it and 'compact' replaces it
+        with a low-bitrate MP4. Returns the bytes freed.
+        """
+        policy = policy or config.ORIGINALS_POLICY
+        if policy == 'keep' or not os.path.exists(video_path):
+            return 0
+
+        if policy == 'delete':
+            freed = self._remove(video_path)
+            if not self.dry_run:
+                self.db.update_video_path(video_id, video_path, 'deleted')
+            return freed
+
+        if policy == 'compact':
+            if self.dry_run:
+                print(f"Would compact {video_path}")
+                return 0
+            base = os.path.splitext(video_path)[0]
+            target_path = f"{base}_compact.mp4"
+            if not self.compact_video(video_path, target_path):
+                print(f"Compaction failed, keeping original: {video_path}")
+                self._remove(target_path)
+                return 0
+            freed = _size(video_path) - _size(target_path)
+            if freed <= 0:
+                # Already smaller than the compact copy would be
+                os.remove(target_path)
+                return 0
+            os.remove(video_path)
+            self.db.update_video_path(video_id, target_path, 'compacted')
+            return freed
+
+        raise ValueError(f"Unknown originals policy: {policy}")
+
+    def apply_retention(self, now=None):
+        """Delete videos past RETENTION_DAYS (FAILED_RETENTION_DAYS for failed ones)"""
+        now = now or datetime.now()
+        deleted = []
+        freed = 0
+        for video in self.db.get_all_videos() or []:
+            if video['processing_status'] in ('queued', 'processing'):
+                continue
+            days = config.FAILED_RETENTION_DAYS if video['processing_status'] == 'failed' else config.RETENTION_DAYS
+            if days and video['upload_time'] < now - timedelta(days=days):
+                video_freed = self.delete_video(video)
+                if video_freed is not None:
+                    freed += video_freed
+                    deleted.append(video['id'])
+        return deleted, freed
+
+    def reconcile(self):
+        """
+        Match the database against the files on disk.
+
+        Deletes files that no video row refers to and marks unprocessed
+        videos whose original is missing as failed. Returns a report dict.
+        """
+        report = {'orphan_files': [], 'missing_originals': [], 'freed_bytes': 0}
+        videos = self.db.get_all_videos()
+        if videos is None:
+            # Without the rows every file would look orphaned
+            print("Could not read videos from the database; skipping reconciliation")
+            return report
+        video_ids = {video['id'] for video in videos}
+        originals = {os.path.abspath(video['video_path']) for video in videos}
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+
+        # Uploads without a row; only video files (originals and *_compact.mp4
+        # copies), so .gitkeep and other files placed there are left alone
+        if os.path.isdir(config.UPLOAD_FOLDER):
+            for name in os.listdir(config.UPLOAD_FOLDER):
+                if name.startswith('.') or not allowed_file(name):
+                    continue
+                path = os.path.join(config.UPLOAD_FOLDER, name)
+                if (os.path.isfile(path) and os.path.abspath(path) not in originals
+                        and os.path.getmtime(path) < cutoff):
+                    report['orphan_files'].append(path)
+                    report['freed_bytes'] += self._remove(path)
+
+        # Outputs of deleted videos, and partial outputs of workers that died mid-job
+        if os.path.isdir(config.PROCESSED_FOLDER):
+            for name in os.listdir(config.PROCESSED_FOLDER):
+                match = OUTPUT_FILE_PATTERN.match(name)
+                path = os.path.join(config.PROCESSED_FOLDER, name)
+                if (match and (int(match.group(2)) not in video_ids or PART_FILE_PATTERN.search(name))
+                        and os.path.getmtime(path) < cutoff):
+                    report['orphan_files'].append(path)
+                    report['freed_bytes'] += self._remove(path)
+
+        # Rows whose original is gone without the originals policy removing it
+        for video in videos:
+            if video['original_status'] == 'deleted' or os.path.exists(video['video_path']):
+                continue
+            report['missing_originals'].append(video['id'])
+            if video['processing_status'] == 'pending' and not self.dry_run:
+                self.db.update_video_status(video['id'], 'failed')
+        return report
+
+    def cleanup(self):
+        """Retention followed by reconciliation"""
+        deleted, freed = self.apply_retention()
+        report = self.reconcile()
+        report['deleted_videos'] = deleted
+        report['freed_bytes'] += freed
+        return report
+
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def main():
+    from database.db_handler import Database
+
+    parser = argparse.ArgumentParser(description='Manage stored videos')
+    parser.add_argument('command', choices=['usage', 'cleanup', 'reconcile'])
+    parser.add_argument('--dry-run', action='store_true', help='report what would be deleted without deleting')
+    args = parser.parse_args()
+
+    db = Database(**config.DB_SETTINGS)
+    manager = StorageManager(db, dry_run=args.dry_run)
+
+    if args.command == 'usage':
+        usage = {}
+        for video in db.get_all_videos() or []:
+            usage[video['user_id']] = usage.get(video['user_id'], 0) + manager.video_usage(video)
+        quota = f" of {config.USER_QUOTA_MB} MB" if config.USER_QUOTA_MB else ''
+        for user_id, used in sorted(usage.items(), key=lambda item: -item[1]):
+            print(f"user {user_id}: {_format_bytes(used)}{quota}")
+        return
+
+    report = manager.cleanup() if args.command == 'cleanup' else manager.reconcile()
+    for video_id in report.get('deleted_videos', []):
+        print(f"Deleted expired video {video_id}")
+    for path in report['orphan_files']:
+        print(f"Orphan file: {path}")
+    for video_id in report['missing_originals']:
+        print(f"Original missing for video {video_id}")
+    action = 'Would free' if args.dry_run else 'Freed'
+    print(f"{action} {_format_bytes(report['freed_bytes'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,12 @@
 import os
 import sys
+import importlib.util
 import pymysql
-from ultralytics import YOLO
 
-def verify_setup():
+# Packages needed by the web tier and by the processing workers
+REQUIRED_PACKAGES = ['flask', 'pymysql', 'cv2', 'numpy', 'ultralytics', 'torch']
+
+def verify_setup(load_model=False):
     print("--- Environment Verification ---")
     
     # Check directories
@@ -15,6 +18,13 @@ def verify_setup():
             print(f"[ERROR] Directory missing: {folder}")
             os.makedirs(folder, exist_ok=True)
             print(f"      Created: {folder}")
+    
+    # Check packages are installed without importing them (importing torch takes seconds)
+    for package in REQUIRED_PACKAGES:
+        if importlib.util.find_spec(package) is not None:
+            print(f"[OK] Package installed: {package}")
+        else:
+            print(f"[ERROR] Package missing: {package}")
             
     # Check Database
     try:
@@ -24,15 +34,23 @@ def verify_setup():
     except Exception as e:
         print(f"[ERROR] MySQL Connection failed: {e}")
         
-    # Check YOLO Model
-    try:
-        model = YOLO('yolov8n.pt')
-        print("[OK] YOLOv8 Model loaded successfully")
-    except Exception as e:
-        print(f"[ERROR] YOLOv8 Model load failed: {e}")
+    # Check YOLO Model (weights are downloaded on first use if missing)
+    if os.path.exists('yolov8n.pt'):
+        print("[OK] YOLOv8 weights found: yolov8n.pt")
+    else:
+        print("[INFO] YOLOv8 weights not found; they will be downloaded on first use")
+    
+    if load_model:
+        try:
+            from ultralytics import YOLO
+            model = YOLO('yolov8n.pt')
+            print("[OK] YOLOv8 Model loaded successfully")
+        except Exception as e:
+            print(f"[ERROR] YOLOv8 Model load failed: {e}")
 
 if __name__ == "__main__":
     # Ensure we are in the right directory
     base_dir = r'c:\Users\Vaibhav\OneDrive\Desktop\traffic_vehicle_detection_demo\traffic_vehicle_detection'
     os.chdir(base_dir)
-    verify_setup()
+    # --load-model also loads the weights, which imports torch
+    verify_setup(load_model='--load-model' in sys.argv)
@@ -0,0 +1,280 @@
+"""
+Processing worker.
+
+Pulls video processing jobs from the processing_jobs table, runs them and
+writes progress, results and status back to the database, where the web
+tier reads them. Run one or more workers per machine, next to or separate
+from the web servers:
+
+    python worker.py                         # one job at a time
+    python worker.py --concurrency 2 --metrics-port 9100
+
+Workers need the same database and the same upload/processed folders
+(shared storage) as the web tier; see config.py.
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from database.db_handler import Database
+from monitoring import metrics
+from storage.manager import StorageManager
+
+
+def part_path(path, token):
+    """Temporary name for an output of one run, e.g. processed_12.part-3f9a1c2e.mp4"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.part-{token}{ext}"
+
+
+class JobWorker:
+    """
+    Claims queued jobs and runs them, one at a time per worker thread.
+
+    Each worker loads the model once and keeps it for all its jobs, so a
+    batch of hundreds of short clips does not reload it per clip.
+    """
+
+    # Minimum seconds between progress writes to the database
+    PROGRESS_INTERVAL = 2.0
+
+    def __init__(self, db, worker_id=None, poll_interval=None, stale_after=None):
+        self.db = db
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = poll_interval if poll_interval is not None else config.JOB_POLL_INTERVAL
+        self.stale_after = stale_after if stale_after is not None else config.JOB_STALE_AFTER
+        self.stop_event = threading.Event()
+        self.storage = StorageManager(db)
+        self.model = None
+
+    def get_model(self):
+        """The YOLO model, loaded on the first job and reused for the rest"""
+        if self.model is None:
+            # Imported here so that importing worker.py does not load torch
+            from ultralytics import YOLO
+            self.model = YOLO(config.YOLO_MODEL)
+        return self.model
+
+    def heartbeat(self, job_id, done, lost):
+        """Refresh the job's heartbeat until done is set; sets lost if the job was requeued"""
+        while not done.wait(config.JOB_HEARTBEAT_INTERVAL):
+            # None means the database was unreachable: keep going and retry
+            if self.db.heartbeat_job(job_id, self.worker_id) is False:
+                print(f"[{self.worker_id}] Job {job_id} was requeued; stopping this run")
+                lost.set()
+                return
+
+    def process_job(self, job):
+        """Run one claimed job and record its outcome"""
+        job_id = job['id']
+        video_id = job['video_id']
+        options = job['options']
+
+        metrics.JOBS_IN_FLIGHT.inc()
+        job_start = time.perf_counter()
+        print(f"[{self.worker_id}] Processing job {job_id} (video {video_id})")
+
+        # Heartbeat on a timer rather than with progress: videos that report no frame
+        # count never call the progress callback, and a stale job would be run twice
+        heartbeat_done = threading.Event()
+        lost = threading.Event()
+        threading.Thread(target=self.heartbeat, args=(job_id, heartbeat_done, lost),
+                         name=f"job-heartbeat-{job_id}", daemon=True).start()
+
+        # Outputs are written under names unique to this run and renamed into place
+        # only once the job is known to still be ours, so a run whose job was
+        # requeued never writes over the new owner's files
+        run_token = uuid.uuid4().hex[:8]
+        outputs = {}
+
+        try:
+            self.db.update_video_status(video_id, 'processing')
+
+            # Fresh tracking and counting state per job, sharing this worker's model
+            from models.vehicle_detector import VehicleDetector
+            detector = VehicleDetector(imgsz=options.get('imgsz'), zones=options.get('zones'),
+                                       model=self.get_model())
+            detector.stage_timer = metrics.StageMetrics()
+
+            # Output path (counts-only jobs write no video)
+            output_path = config.processed_video_path(video_id)
+            if options.get('mode') == 'counts_only':
+                # Drop any annotated video left over from an earlier run
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+            else:
+                outputs[output_path] = part_path(output_path, run_token)
+
+            profile_path = config.profile_path(video_id)
+            if not options.get('profile'):
+                # Drop a profile left over from an earlier run so it is not shown with these results
+                if os.path.exists(profile_path):
+                    os.remove(profile_path)
+            else:
+                outputs[profile_path] = part_path(profile_path, run_token)
+
+            for path in (config.poster_path(video_id), config.sprite_path(video_id)):
+                outputs[path] = part_path(path, run_token)
+
+            last_report = [0.0]
+
+            def report_progress(progress):
+                now = time.monotonic()
+                if now - last_report[0] >= self.PROGRESS_INTERVAL:
+                    last_report[0] = now
+                    self.db.update_job_progress(job_id, self.worker_id, int(progress))
+
+            success, counts = detector.process_video(job['video_path'], outputs.get(output_path),
+                                                     show_preview=False,
+                                                     profile_path=outputs.get(profile_path),
+                                                     progress_callback=report_progress,
+                                                     poster_path=outputs[config.poster_path(video_id)],
+                                                     sprite_path=outputs[config.sprite_path(video_id)],
+                                                     stop_event=lost)
+
+            if lost.is_set() or not self.db.owns_job(job_id, self.worker_id):
+                # Requeued while running (e.g. missed heartbeats); the new owner reports the results
+                print(f"[{self.worker_id}] Job {job_id} was requeued; discarding this run's results")
+                metrics.JOBS_FINISHED.inc(status='lost')
+            elif success:
+                for path, part in outputs.items():
+                    if os.path.exists(part):
+                        os.replace(part, path)
+                
+                # Save results to database
+                self.db.save_vehicle_counts(video_id, counts)
+                self.db.save_zone_counts(video_id, detector.zone_counter.counts)
+                if detector.inference_size:
+                    self.db.save_inference_size(video_id, detector.inference_size)
+                
+                # Keep, delete or compact the original (ORIGINALS_POLICY) while the job
+                # still counts as running, so /process cannot queue a rerun on it meanwhile
+                self.storage.apply_originals_policy(video_id, job['video_path'])
+                if self.db.finish_job(job_id, self.worker_id, 'completed'):
+                    self.db.update_video_status(video_id, 'completed')
+                    metrics.JOBS_FINISHED.inc(status='completed')
+            else:
+                self.fail_job(job_id, video_id, str(counts))
+
+        except Exception as e:
+            print(f"Error processing video {video_id}: {e}")
+            traceback.print_exc()
+            self.fail_job(job_id, video_id, str(e))
+        finally:
+            heartbeat_done.set()
+            # Partial files of a failed, stopped or lost run
+            for part in outputs.values():
+                if os.path.exists(part):
+                    os.remove(part)
+            metrics.JOBS_IN_FLIGHT.dec()
+            metrics.JOB_SECONDS.observe(time.perf_counter() - job_start)
+
+    def fail_job(self, job_id, video_id, error):
+        """Mark a job failed, unless it was requeued to another worker meanwhile"""
+        if self.db.finish_job(job_id, self.worker_id, 'failed', error):
+            self.storage.remove_outputs(video_id)
+            self.db.update_video_status(video_id, 'failed')
+            metrics.JOBS_FINISHED.inc(status='failed')
+
+    def run(self):
+        """Process jobs until stop() is called"""
+        print(f"[{self.worker_id}] Worker started")
+        last_stale_check = 0.0
+        while not self.stop_event.is_set():
+            # Recover jobs from workers that died mid-job
+            if time.monotonic() - last_stale_check > self.stale_after:
+                last_stale_check = time.monotonic()
+                requeued = self.db.requeue_stale_jobs(self.stale_after)
+                if requeued:
+                    print(f"[{self.worker_id}] Requeued {requeued} stale job(s)")
+
+            job = self.db.claim_job(self.worker_id)
+            if job is None:
+                self.stop_event.wait(self.poll_interval)
+                continue
+            self.process_job(job)
+        print(f"[{self.worker_id}] Worker stopped")
+
+    def stop(self):
+        """Stop after the current job"""
+        self.stop_event.set()
+
+
+def start_workers(db, concurrency=1):
+    """Start worker threads in this process; returns the JobWorker objects"""
+    base_id = f"{socket.gethostname()}:{os.getpid()}"
+    workers = []
+    for index in range(concurrency):
+        worker = JobWorker(db, worker_id=f"{base_id}:{index}")
+        thread = threading.Thread(target=worker.run, name=f"job-worker-{index}", daemon=True)
+        thread.start()
+        workers.append(worker)
+    return workers
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.render_metrics().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port):
+    """Expose this worker's metrics on http://0.0.0.0:<port>/metrics"""
+    server = ThreadingHTTPServer(('0.0.0.0', port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run video processing workers')
+    parser.add_argument('--concurrency', type=int, default=1, help='jobs processed in parallel')
+    parser.add_argument('--metrics-port', type=int, help='serve Prometheus metrics on this port')
+    args = parser.parse_args()
+
+    os.makedirs(config.PROCESSED_FOLDER, exist_ok=True)
+    db = Database(**config.DB_SETTINGS)
+
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+
+    workers = start_workers(db, args.concurrency)
+
+    stopped = threading.Event()
+
+    def shutdown(signum, frame):
+        print("Shutting down after current jobs...")
+        for worker in workers:
+            worker.stop()
+        stopped.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    while not stopped.wait(1):
+        pass
+
+    # Wait for running jobs to finish
+    for thread in threading.enumerate():
+        if thread.name.startswith('job-worker-'):
+            thread.join()
+
+
+if __name__ == '__main__':
+    main()